@@ -6,26 +6,87 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "DEBUG").upper())
 
 class Base(DeclarativeBase):
     pass
 
-# Initialize SQLAlchemy with the Base class
-db = SQLAlchemy(model_class=Base)
+# Initialize SQLAlchemy with the Base class. Objects are not expired on commit:
+# routes keep using the user, balance and budget they loaded after committing,
+# and expiring them would reload each one with its own SELECT.
+db = SQLAlchemy(model_class=Base, session_options={"expire_on_commit": False})
 
 # Create the Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
-# Configure the SQLite database
+# Amounts are Decimals internally; send them to the front end as JSON numbers
+from money import MoneyJSONProvider
+app.json = MoneyJSONProvider(app)
+
+# Configure the database (SQLite by default, Postgres via DATABASE_URL)
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///expense_tracker.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Connection pool per worker process (Postgres and other server databases)
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+app.config["DB_POOL_TIMEOUT"] = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 300))
+app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+# Pragmas applied to every SQLite connection
+app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+from database import engine_options, configure_engine
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
+# Page sizes for GET /api/expenses?limit=N
+app.config["EXPENSES_PAGE_SIZE"] = int(os.environ.get("EXPENSES_PAGE_SIZE", 100))
+app.config["EXPENSES_MAX_PAGE_SIZE"] = int(os.environ.get("EXPENSES_MAX_PAGE_SIZE", 500))
+
+# In-process cache of /api/user-data payloads (entries, seconds)
+app.config["USER_DATA_CACHE_SIZE"] = int(os.environ.get("USER_DATA_CACHE_SIZE", 1024))
+app.config["USER_DATA_CACHE_TTL"] = int(os.environ.get("USER_DATA_CACHE_TTL", 30))
+
+# JSON responses at least this large are gzipped for clients that accept it
+app.config["JSON_GZIP_MIN_BYTES"] = int(os.environ.get("JSON_GZIP_MIN_BYTES", 1024))
+
+# Exports stream rows from the database in batches of this size
+app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+app.config["EXPORT_GZIP"] = os.environ.get("EXPORT_GZIP", "1") == "1"
+# Imports insert rows in batches of this size
+app.config["IMPORT_BATCH_SIZE"] = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+# Upload limits; Flask rejects larger request bodies with 413
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("IMPORT_MAX_BYTES", 100 * 1024 * 1024))
+app.config["IMPORT_MAX_ROWS"] = int(os.environ.get("IMPORT_MAX_ROWS", 1_000_000))
+# Most items accepted by one POST /api/expenses/batch or /api/income/batch
+app.config["BATCH_MAX_ITEMS"] = int(os.environ.get("BATCH_MAX_ITEMS", 1000))
+# Most ids accepted by the bulk delete/recategorize endpoints (filters are unlimited)
+app.config["BULK_MAX_IDS"] = int(os.environ.get("BULK_MAX_IDS", 30000))
+# Background threads per process for ?async=1 imports
+app.config["IMPORT_WORKERS"] = int(os.environ.get("IMPORT_WORKERS", 2))
+# Running jobs write their progress to the job row this often (in rows), and are
+# reported failed once nothing has been heard from them for this long
+app.config["IMPORT_PROGRESS_ROWS"] = int(os.environ.get("IMPORT_PROGRESS_ROWS", 10000))
+app.config["IMPORT_JOB_STALE_SECONDS"] = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", 900))
+# Excel exports larger than this are spooled to a temp file rather than kept in memory
+app.config["EXPORT_SPOOL_MAX_BYTES"] = int(os.environ.get("EXPORT_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+
+# Opt-in per-route request/SQL metrics at /metrics
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "0") == "1"
+# Profile a sample of requests and dump those slower than this to PROFILE_DIR (0 = off)
+app.config["PROFILE_SLOW_MS"] = int(os.environ.get("PROFILE_SLOW_MS", 0))
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.1))
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", "profiles")
+
+# Warn when a request runs more SQL statements than this (0 = off); strict mode raises
+# under the test client instead, so an N+1 regression fails tests
+app.config["QUERY_BUDGET"] = int(os.environ.get("QUERY_BUDGET", 0))
+app.config["QUERY_BUDGET_STRICT"] = os.environ.get("QUERY_BUDGET_STRICT", "0") == "1"
+
 # Initialize the app with the extension
 db.init_app(app)
 
@@ -33,10 +94,29 @@ db.init_app(app)
 with app.app_context():
     # Import models here to avoid circular imports
     import models
-    from models import User, Expense, Income, Balance, Budget
+    from models import User, Expense, Income, Balance, Budget, MonthlySummary, ImportJob, RecurringSeries
+    
+    # SQLite pragmas must be registered before the first connection is made
+    configure_engine(db.engine, app.config)
     
-    db.create_all()
+    # Create tables and bring older databases up to date (indexes, etc.)
+    from migrations import upgrade_database
+    upgrade_database()
+    # Don't let pooled connections from startup cross a fork into gunicorn workers
+    db.engine.dispose()
+    
+    # Size the dashboard cache from the config
+    from cache import user_data_cache
+    user_data_cache.configure(app.config["USER_DATA_CACHE_SIZE"], app.config["USER_DATA_CACHE_TTL"])
     
     # Import and register routes
     from routes import register_routes
     register_routes(app)
+    
+    # Request metrics and slow-request profiling, when enabled
+    from instrumentation import init_instrumentation
+    init_instrumentation(app, db)
+    
+    # Register maintenance CLI commands
+    from commands import register_commands
+    register_commands(app)
@@ -0,0 +1,87 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, union_all, or_
+from app import db
+from models import User, Expense, ExpenseArchive
+
+# Rows moved per DELETE ... RETURNING / INSERT round, each in its own transaction
+ARCHIVE_BATCH_SIZE = 5000
+
+def expense_models(user_id, start_date=None):
+    """
+    The tables to read a user's expenses dated from `start_date` on: the hot
+    expense table alone when the range starts at or after the user's archive
+    cutoff, otherwise the archive as well. The hot table is always read, as
+    backdated expenses can land there after a month was archived.
+    """
+    # Usually the request's current user, so this is an identity-map hit
+    user = db.session.get(User, user_id)
+    cutoff = user.archived_before if user else None
+    if cutoff is None or (start_date is not None and start_date >= cutoff):
+        return [Expense]
+    return [Expense, ExpenseArchive]
+
+def all_expenses(user_id=None, start_date=None, end_date=None, criteria=None):
+    """
+    Subquery over every expense in both tables (id, user_id, description,
+    category_id, amount, date), for rebuilding the rollups. `criteria(model)`
+    adds a condition to each table's branch, where its indexes apply.
+    """
+    branches = []
+    for model in (Expense, ExpenseArchive):
+        query = select(model.id, model.user_id, model.description, model.category_id, model.amount, model.date)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        if criteria is not None:
+            query = query.where(criteria(model))
+        if start_date is not None:
+            query = query.where(model.date >= start_date)
+        if end_date is not None:
+            query = query.where(model.date < end_date)
+        branches.append(query)
+    return union_all(*branches).subquery()
+
+def closed_month_cutoff(keep_months, today=None):
+    """First day of the month `keep_months` before the current one"""
+    today = today or datetime.utcnow()
+    index = today.year * 12 + today.month - 1 - keep_months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def archive_expenses(before, user_id=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move expenses dated before `before` (a month boundary no later than the
+    start of the current month) from the expense table to expense_archive,
+    for one user or all of them. Monthly summaries and recurring series cover
+    both tables and are left as they are. Returns the number of rows moved.
+    """
+    if before.day != 1 or before.time() != datetime.min.time():
+        raise ValueError('The cutoff must be the first day of a month')
+    if before > closed_month_cutoff(0):
+        raise ValueError('Only closed months can be archived')
+
+    # Readers include the archive for ranges before the cutoff, so it is
+    # raised first: rows are then visible wherever they are mid-move
+    users = update(User).where(or_(User.archived_before.is_(None), User.archived_before < before))
+    if user_id is not None:
+        users = users.where(User.id == user_id)
+    db.session.execute(users.values(archived_before=before), execution_options={'synchronize_session': False})
+    db.session.commit()
+
+    hot = Expense.__table__
+    criteria = [hot.c.date < before]
+    if user_id is not None:
+        criteria.append(hot.c.user_id == user_id)
+    batch = select(hot.c.id).where(*criteria).order_by(hot.c.id).limit(batch_size)
+
+    # DELETE ... RETURNING hands back exactly the rows it removed, so an
+    # expense written concurrently is either moved whole or left alone
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            delete(hot).where(hot.c.id.in_(batch)).returning(*hot.c)
+        ).mappings().all()
+        if not rows:
+            break
+        db.session.execute(insert(ExpenseArchive.__table__), [dict(row) for row in rows])
+        db.session.commit()
+        moved += len(rows)
+    return moved
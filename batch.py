@@ -0,0 +1,227 @@
+from datetime import datetime
+from sqlalchemy import insert, update, delete
+from app import db
+from models import Expense, Income, Balance
+from archive import expense_models
+from categories import category_id, intern_categories
+from money import parse_amount
+from rollups import row_deltas, apply_summary_deltas, refresh_monthly_summaries
+from recurring import series_added, series_removed
+from utils import adjust_balance, mark_data_changed, parse_date_range, filter_expenses
+
+class BatchError(ValueError):
+    """The request body is not a usable batch or selection (as opposed to one bad item)"""
+
+def _parse_items(items, max_items, parse_item):
+    """
+    Validate a batch with `parse_item(item) -> row dict`, which raises
+    ValueError for a bad item. Returns (rows, {index: error}).
+    """
+    if not isinstance(items, list):
+        raise BatchError('Expected a JSON array of items')
+    if not items:
+        raise BatchError('The batch is empty')
+    if len(items) > max_items:
+        raise BatchError(f'A batch can have at most {max_items} items')
+
+    rows, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Item must be an object')
+            rows.append((index, parse_item(item)))
+        except ValueError as e:
+            errors[index] = str(e)
+    return rows, errors
+
+def _parse_date(item, now):
+    """The item's YYYY-MM-DD date, or now when it has none"""
+    date_str = item.get('date')
+    if not date_str:
+        return now
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        # The single-item route falls back to today; a sync client is better told
+        raise ValueError(f'Invalid date: {date_str!r}')
+
+def _insert_rows(table, rows):
+    """executemany INSERT ... RETURNING id, ids in the order of `rows`"""
+    result = db.session.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [row for _, row in rows]
+    )
+    return [row_id for (row_id,) in result]
+
+def _results(rows, ids, errors):
+    """Per-item results in request order: {'index', 'id'} or {'index', 'error'}"""
+    results = [{'index': index, 'id': row_id} for (index, _), row_id in zip(rows, ids)]
+    results.extend({'index': index, 'error': error} for index, error in errors.items())
+    results.sort(key=lambda result: result['index'])
+    return results
+
+def add_expenses(user, items, max_items):
+    """
+    Insert a batch of expenses in one transaction: one executemany INSERT, one
+    balance adjustment and one rollup update for all valid items. Invalid items
+    are skipped and reported by index. Returns (results, balance).
+    """
+    now = datetime.utcnow()
+
+    def parse_item(item):
+        amount = item.get('amount')
+        category = str(item.get('category') or '').strip()
+        if not amount or not category:
+            raise ValueError('Missing required fields')
+        if len(category) > 50:
+            raise ValueError('Category is longer than 50 characters')
+        return {
+            'description': str(item.get('description') or category).strip()[:120] or category,
+            'amount': parse_amount(amount),
+            'category': category,
+            'date': _parse_date(item, now),
+            'user_id': user.id
+        }
+
+    rows, errors = _parse_items(items, max_items, parse_item)
+    ids = []
+    balance = None
+    if rows:
+        parsed = intern_categories([row for _, row in rows])
+        ids = _insert_rows(Expense.__table__, rows)
+        apply_summary_deltas(user.id, row_deltas((r['category_id'], r['date'], r['amount']) for r in parsed))
+        series_added(user.id, ((r['description'], r['category_id'], r['date'], r['amount']) for r in parsed))
+        balance = adjust_balance(user, -sum(r['amount'] for r in parsed))
+        mark_data_changed(user.id)
+        db.session.commit()
+    elif user.balance:
+        balance = user.balance.amount
+
+    return _results(rows, ids, errors), balance
+
+def add_incomes(user, items, max_items):
+    """
+    Insert a batch of incomes in one transaction with a single balance
+    adjustment. Invalid items are skipped and reported by index.
+    Returns (results, balance).
+    """
+    now = datetime.utcnow()
+
+    def parse_item(item):
+        amount = item.get('amount')
+        if not amount:
+            raise ValueError('Amount is required')
+        return {
+            'description': str(item.get('description') or 'Income').strip()[:120] or 'Income',
+            'amount': parse_amount(amount),
+            'date': _parse_date(item, now),
+            'user_id': user.id
+        }
+
+    rows, errors = _parse_items(items, max_items, parse_item)
+    ids = []
+    balance = None
+    if rows:
+        ids = _insert_rows(Income.__table__, rows)
+        total = sum(row['amount'] for _, row in rows)
+        balance = adjust_balance(user, total)
+        if balance is None:
+            db.session.add(Balance(amount=total, user=user))
+            balance = total
+        mark_data_changed(user.id)
+        db.session.commit()
+    elif user.balance:
+        balance = user.balance.amount
+
+    return _results(rows, ids, errors), balance
+
+def _expense_selection(user_id, selection, max_ids):
+    """
+    Turn a bulk request's selection into the tables it can reach and a function
+    `where(statement, model)` that adds its criteria: "ids" and/or any of
+    "start", "end" (YYYY-MM-DD, inclusive) and "category". Raises BatchError
+    for a malformed or empty selection.
+    """
+    if not isinstance(selection, dict):
+        raise BatchError('Expected a JSON object')
+
+    ids = selection.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+            raise BatchError('ids must be an array of integers')
+        if not ids:
+            raise BatchError('ids is empty')
+        if len(ids) > max_ids:
+            raise BatchError(f'At most {max_ids} ids can be given; use a date range or category instead')
+
+    try:
+        start_date, end_date = parse_date_range(selection)
+    except (TypeError, ValueError):
+        raise BatchError('Invalid date format, expected YYYY-MM-DD')
+    category = selection.get('category')
+
+    # Never let an empty selection mean "everything"
+    if ids is None and not (start_date or end_date or category):
+        raise BatchError('Select expenses by ids or by a start/end/category filter')
+
+    def where(statement, model):
+        statement = filter_expenses(statement, user_id, start_date, end_date, category, model)
+        if ids is not None:
+            statement = statement.where(model.id.in_(ids))
+        return statement
+    return expense_models(user_id, start_date), where
+
+def delete_expenses(user, selection, return_to_balance, max_ids):
+    """
+    Delete the selected expenses with one DELETE ... RETURNING per table, then
+    take the returned rows out of the rollups and, if asked, add their total
+    back to the balance once. Returns (deleted count, new balance or None).
+    """
+    models, where = _expense_selection(user.id, selection, max_ids)
+    deleted = []
+    for model in models:
+        deleted += db.session.execute(
+            where(delete(model), model).returning(model.category_id, model.date, model.amount, model.series_key),
+            execution_options={'synchronize_session': False}
+        ).all()
+
+    balance = user.balance.amount if user.balance else None
+    if deleted:
+        apply_summary_deltas(user.id, row_deltas((row[:3] for row in deleted), sign=-1))
+        series_removed(user.id, {key for *_, key in deleted})
+        if return_to_balance:
+            balance = adjust_balance(user, sum(amount for _, _, amount, _ in deleted))
+        mark_data_changed(user.id)
+    db.session.commit()
+    return len(deleted), balance
+
+def recategorize_expenses(user, selection, new_category, max_ids):
+    """
+    Move the selected expenses to `new_category` with one UPDATE ... RETURNING
+    per table, then recompute the rollups for the months it touched. Returns
+    the number of expenses changed.
+    """
+    new_category = str(new_category or '').strip()
+    if not new_category:
+        raise BatchError('newCategory is required')
+    if len(new_category) > 50:
+        raise BatchError('newCategory is longer than 50 characters')
+
+    models, where = _expense_selection(user.id, selection, max_ids)
+    new_category_id = category_id(new_category)
+    updated = []
+    for model in models:
+        updated += db.session.execute(
+            where(update(model), model).where(model.category_id != new_category_id)
+            .values(category_id=new_category_id)
+            .returning(model.date, model.series_key),
+            execution_options={'synchronize_session': False}
+        ).all()
+
+    if updated:
+        dates = [date for date, _ in updated]
+        refresh_monthly_summaries(user.id, min(dates), max(dates))
+        series_removed(user.id, {key for _, key in updated})
+        mark_data_changed(user.id)
+    db.session.commit()
+    return len(updated)
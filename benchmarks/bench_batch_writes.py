@@ -0,0 +1,72 @@
+"""Items/sec of the batch write endpoints vs. one POST per item
+
+    python -m benchmarks.bench_batch_writes --items 5000 --batch-sizes 100 1000
+
+Runs through the Flask test client against a temporary SQLite database, so
+the numbers are server-side cost without network round trips (which only
+widen the gap).
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import CATEGORIES, load_app, remove_database, create_users
+
+def expense_items(count, seed=1):
+    rng = random.Random(seed)
+    return [{
+        'amount': rng.randint(100, 500_000) / 100,
+        'category': rng.choice(CATEGORIES),
+        'date': f'2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+    } for _ in range(count)]
+
+def income_items(count, seed=2):
+    rng = random.Random(seed)
+    return [{'amount': rng.randint(1000, 1_000_000) / 100, 'description': 'Salary'}
+            for _ in range(count)]
+
+def single(client, path, items):
+    for item in items:
+        response = client.post(path, json=item)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+def batched(client, path, items, batch_size):
+    for start in range(0, len(items), batch_size):
+        response = client.post(path, json=items[start:start + batch_size])
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.json['rejectedCount'] == 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    app, db, db_path = load_app()
+    try:
+        with app.app_context():
+            # A fresh user per case so every case starts from the same empty state
+            user_ids = iter(create_users(db, 2 * (1 + len(args.batch_sizes))))
+
+        cases = [
+            ('expenses', '/api/expenses', '/api/expenses/batch', expense_items(args.items)),
+            ('incomes', '/api/income', '/api/income/batch', income_items(args.items)),
+        ]
+        for name, single_path, batch_path, items in cases:
+            print(f"\n{args.items} {name}:")
+            runs = [('one per request', lambda client: single(client, single_path, items))]
+            runs += [(f'batches of {size}', lambda client, size=size: batched(client, batch_path, items, size))
+                     for size in args.batch_sizes]
+            for label, run in runs:
+                client = app.test_client()
+                with client.session_transaction() as session:
+                    session['user_id'] = next(user_ids)
+                start = time.perf_counter()
+                run(client)
+                elapsed = time.perf_counter() - start
+                print(f"  {label:<18} {elapsed:8.2f} s  {args.items / elapsed:10.0f} items/s")
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Write-only streaming Excel export vs. the old in-memory Workbook export
+
+    python -m benchmarks.bench_export_excel --sizes 100000 1000000
+
+Each case runs in its own interpreter so peak RSS is measured per export.
+"""
+import argparse
+import io
+import time
+
+from benchmarks.common import (load_app, remove_database, create_users, generate_expense_rows,
+                               bulk_insert, peak_rss_mb, run_isolated)
+
+def legacy_export(user_id):
+    """The previous implementation: a full Workbook with string-addressed cells"""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from models import Expense
+    from categories import category_names
+
+    expenses = Expense.query.filter_by(user_id=user_id).order_by(Expense.date.desc()).all()
+    names = category_names({expense.category_id for expense in expenses})
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Expenses"
+    headers = ['ID', 'Description', 'Amount', 'Category', 'Date']
+    for col_num, header in enumerate(headers, 1):
+        col_letter = get_column_letter(col_num)
+        ws[f'{col_letter}1'] = header
+        ws[f'{col_letter}1'].font = ws[f'{col_letter}1'].font.copy(bold=True)
+    for row_num, expense in enumerate(expenses, 2):
+        ws[f'A{row_num}'] = expense.id
+        ws[f'B{row_num}'] = expense.description
+        ws[f'C{row_num}'] = expense.amount
+        ws[f'D{row_num}'] = names[expense.category_id]
+        ws[f'E{row_num}'] = expense.date.strftime('%Y-%m-%d')
+    output = io.BytesIO()
+    wb.save(output)
+    return len(output.getvalue())
+
+def run_case(db_path, case, user_id):
+    """Child process: run one export against an already populated database"""
+    app, db, _ = load_app(db_path)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+    start = time.perf_counter()
+    if case == 'legacy':
+        with app.app_context():
+            size = legacy_export(user_id)
+    else:
+        response = client.get('/api/export/excel')
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.2f} {peak_rss_mb():.0f} {size}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--case', choices=['legacy', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.db, args.case, args.user_id)
+        return
+
+    # One user per size, all in the same temporary database
+    app, db, db_path = load_app()
+    try:
+        with app.app_context():
+            from models import Expense
+            user_ids = create_users(db, len(args.sizes))
+            for user_id, rows in zip(user_ids, args.sizes):
+                bulk_insert(db, Expense.__table__, generate_expense_rows([user_id], rows))
+            db.engine.dispose()
+
+        for user_id, rows in zip(user_ids, args.sizes):
+            print(f"\n{rows} rows:")
+            for case in ('legacy', 'streaming'):
+                elapsed, rss, size = run_isolated('benchmarks.bench_export_excel', '--case', case,
+                                                  '--db', db_path, '--user-id', user_id).split()
+                print(f"  {case:<10} {float(elapsed):8.2f} s  peak RSS {rss:>6} MiB  "
+                      f"file {int(size) / 1024 / 1024:.1f} MiB")
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
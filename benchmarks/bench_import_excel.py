@@ -0,0 +1,79 @@
+"""Peak RSS of reading an Excel upload: full workbook from bytes vs. read-only streaming
+
+    python -m benchmarks.bench_import_excel --sizes 100000 500000
+
+Only the read/parse step is measured; each case runs in its own interpreter,
+with the same modules loaded, and also reports how much the parse raised the peak.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.common import CATEGORIES, load_app, remove_database, peak_rss_mb, run_isolated
+
+def write_workbook(path, rows):
+    """Write an export-shaped workbook with `rows` data rows"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Expenses")
+    ws.append(['ID', 'Description', 'Amount', 'Category', 'Date'])
+    for i in range(rows):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        ws.append([i, f'{category} {i}', (i % 5000) + 0.5, category, f'2026-{i % 12 + 1:02d}-15'])
+    wb.save(path)
+
+def run_case(path, case):
+    """
+    Child process: read every row of the workbook and report the time, the
+    peak RSS and how much the parse raised it
+    """
+    # Both cases load the same modules (importer pulls in the app, so it gets
+    # a throwaway database) before the baseline is taken
+    app, db, db_path = load_app()
+    try:
+        from openpyxl import load_workbook
+        from importer import read_excel_rows
+
+        baseline_rss = peak_rss_mb()
+        start = time.perf_counter()
+        with open(path, 'rb') as upload:
+            if case == 'legacy':
+                wb = load_workbook(filename=io.BytesIO(upload.read()))
+                count = sum(1 for _ in wb.active.iter_rows(min_row=2, values_only=True))
+            else:
+                count = sum(1 for _ in read_excel_rows(upload))
+        elapsed = time.perf_counter() - start
+        print(f"{elapsed:.2f} {peak_rss_mb():.0f} {peak_rss_mb() - baseline_rss:.0f} {count}")
+    finally:
+        remove_database(db_path, app, db)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--case', choices=['legacy', 'read-only'], help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.path, args.case)
+        return
+
+    for rows in args.sizes:
+        fd, path = tempfile.mkstemp(prefix='bench-', suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_workbook(path, rows)
+            print(f"\n{rows} rows ({os.path.getsize(path) / 1024 / 1024:.1f} MiB file):")
+            for case in ('legacy', 'read-only'):
+                elapsed, rss, growth, count = run_isolated('benchmarks.bench_import_excel',
+                                                           '--case', case, '--path', path).split()
+                print(f"  {case:<10} {float(elapsed):8.2f} s  peak RSS {rss:>6} MiB "
+                      f"(+{growth:>5} MiB parsing)  rows {count}")
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
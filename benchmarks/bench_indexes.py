@@ -0,0 +1,75 @@
+"""Query plans and latency of the hot expense queries with and without indexes
+
+    python -m benchmarks.bench_indexes --rows 1000000 --users 100
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import text
+
+from benchmarks.common import (load_app, remove_database, create_users, generate_expense_rows,
+                               bulk_insert, time_call, format_stats)
+
+def explain(db, query):
+    """Return SQLite's query plan for an ORM query"""
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+    return '; '.join(row[-1] for row in rows)
+
+def run_queries(db, user_id, repeat):
+    from models import Expense
+    from utils import get_monthly_expenses
+    from categories import category_id
+
+    now = datetime.now()
+    start = datetime(now.year, now.month, 1)
+    cases = [
+        ('monthly', lambda: get_monthly_expenses(user_id, now.month, now.year),
+         Expense.query.filter(Expense.user_id == user_id, Expense.date >= start)
+         .order_by(Expense.date.desc())),
+        ('monthly + category', lambda: get_monthly_expenses(user_id, now.month, now.year, 'Food'),
+         Expense.query.filter(Expense.user_id == user_id, Expense.date >= start,
+                              Expense.category_id == category_id('Food')).order_by(Expense.date.desc())),
+        ('full history', lambda: Expense.query.filter_by(user_id=user_id)
+         .order_by(Expense.date.desc()).all(),
+         Expense.query.filter_by(user_id=user_id).order_by(Expense.date.desc())),
+    ]
+    for name, fn, query in cases:
+        print(f"  {name:<20} {format_stats(time_call(fn, repeat))}")
+        print(f"  {'':<20} plan: {explain(db, query)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db, db_path = load_app()
+    try:
+        with app.app_context():
+            from models import Expense
+
+            # Start from the pre-index schema
+            for index in Expense.__table__.indexes:
+                index.drop(db.engine, checkfirst=True)
+
+            user_ids = create_users(db, args.users)
+            print(f"Inserting {args.rows} expenses for {args.users} users...")
+            bulk_insert(db, Expense.__table__, generate_expense_rows(user_ids, args.rows))
+            db.session.execute(text('ANALYZE'))
+
+            print("\nWithout indexes:")
+            run_queries(db, user_ids[0], args.repeat)
+
+            from migrations import _create_user_date_indexes
+            _create_user_date_indexes(fresh=False)
+            db.session.execute(text('ANALYZE'))
+
+            print("\nWith indexes:")
+            run_queries(db, user_ids[0], args.repeat)
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
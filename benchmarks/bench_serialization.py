@@ -0,0 +1,71 @@
+"""Column-tuple serialization vs. per-row ORM dicts for expense listings
+
+    python -m benchmarks.bench_serialization --rows 100000
+"""
+import argparse
+
+from benchmarks.common import (load_app, remove_database, create_users, generate_expense_rows,
+                               bulk_insert, time_call, format_stats)
+
+def legacy_listing(user_id):
+    """The previous implementation: ORM objects, a dict per row, strftime, jsonify"""
+    from flask import jsonify
+    from models import Expense
+    from categories import category_names
+
+    expenses = Expense.query.filter_by(user_id=user_id).order_by(Expense.date.desc()).all()
+    names = category_names({expense.category_id for expense in expenses})
+    expenses_list = []
+    for expense in expenses:
+        expenses_list.append({
+            'id': expense.id,
+            'description': expense.description,
+            'amount': expense.amount,
+            'category': names[expense.category_id],
+            'date': expense.date.strftime('%Y-%m-%d')
+        })
+    return jsonify(expenses_list).get_data()
+
+def columnar_listing(user_id, layout):
+    """The new path: selected columns, bulk date formatting, fast encoder"""
+    from sqlalchemy import select
+    from app import db
+    from models import Expense
+    from serializers import EXPENSE_COLUMNS, EXPENSE_FIELDS, serialize_rows, encode_json
+
+    rows = db.session.execute(
+        select(*EXPENSE_COLUMNS).where(Expense.user_id == user_id).order_by(Expense.date.desc())
+    ).all()
+    return encode_json(serialize_rows(rows, EXPENSE_FIELDS, layout))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db, db_path = load_app()
+    try:
+        with app.test_request_context():
+            from models import Expense
+            from serializers import orjson
+
+            user_ids = create_users(db, 1)
+            bulk_insert(db, Expense.__table__, generate_expense_rows(user_ids, args.rows))
+            user_id = user_ids[0]
+
+            print(f"{args.rows} rows (orjson {'available' if orjson else 'not installed'}):")
+            cases = [
+                ('ORM + dict per row', lambda: legacy_listing(user_id)),
+                ('columns, records', lambda: columnar_listing(user_id, 'records')),
+                ('columns, columnar', lambda: columnar_listing(user_id, 'columnar')),
+            ]
+            for name, fn in cases:
+                size = len(fn())
+                print(f"  {name:<20} {format_stats(time_call(fn, args.repeat))}  "
+                      f"{size / 1024 / 1024:.1f} MiB")
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Summary-backed trend query vs. the old one-query-per-month loop
+
+    python -m benchmarks.bench_trends --rows 500000 --users 20
+"""
+import argparse
+from datetime import datetime
+
+from benchmarks.common import (load_app, remove_database, create_users, generate_expense_rows,
+                               bulk_insert, time_call, format_stats)
+
+def legacy_trend(user_id, number_of_months):
+    """The previous implementation: one query and full row load per month"""
+    from utils import get_monthly_expenses
+
+    today = datetime.today()
+    monthly_data = []
+    for i in range(number_of_months):
+        month = today.month - i
+        year = today.year
+        while month <= 0:
+            month += 12
+            year -= 1
+        expenses = get_monthly_expenses(user_id, month, year)
+        monthly_data.append({'month': month, 'year': year,
+                             'total': sum(expense.amount for expense in expenses)})
+    monthly_data.reverse()
+    return monthly_data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db, db_path = load_app()
+    try:
+        with app.app_context():
+            from models import Expense
+            from rollups import rebuild_monthly_summaries
+            from utils import get_monthly_trend_data
+
+            user_ids = create_users(db, args.users)
+            print(f"Inserting {args.rows} expenses for {args.users} users over 60 months...")
+            bulk_insert(db, Expense.__table__,
+                        generate_expense_rows(user_ids, args.rows, months=60))
+            rebuild_monthly_summaries()
+            db.session.commit()
+            user_id = user_ids[0]
+
+            for months in (12, 24, 60):
+                # Both implementations must agree before timing them
+                new = get_monthly_trend_data(user_id, months)
+                old = legacy_trend(user_id, months)
+                assert all(abs(a['total'] - b['total']) < 0.01 for a, b in zip(new, old))
+
+                print(f"\n{months}-month window:")
+                print(f"  per-month loop  {format_stats(time_call(lambda: legacy_trend(user_id, months), args.repeat))}")
+                print(f"  summary query   {format_stats(time_call(lambda: get_monthly_trend_data(user_id, months), args.repeat))}")
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Shared helpers for the benchmark scripts
+
+Every benchmark runs against a throwaway SQLite database so it never touches
+the real expense_tracker.db. Run them from the project root, e.g.:
+
+    python -m benchmarks.bench_indexes --rows 1000000
+"""
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Shopping', 'Utilities',
+              'Rent', 'Medical', 'Education', 'Other']
+
+def load_app(db_path=None):
+    """Import the Flask app bound to a temporary SQLite database"""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='bench-', suffix='.db')
+        os.close(fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import app, db
+
+    # app.py turns on DEBUG logging, which drowns the benchmark output
+    logging.getLogger().setLevel(logging.WARNING)
+    return app, db, db_path
+
+def remove_database(db_path, app=None, db=None):
+    """
+    Delete a temporary database along with the -wal and -shm files WAL mode
+    leaves next to it, closing the app's pooled connections first
+    """
+    if app is not None:
+        with app.app_context():
+            db.engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+def create_users(db, count):
+    """Create `count` users with a zero balance and budget, returning their ids"""
+    from models import User, Balance, Budget
+
+    users = []
+    for i in range(count):
+        user = User(username=f'bench_user_{i}', email=f'bench{i}@example.com')
+        db.session.add(user)
+        db.session.add(Balance(amount=0.0, user=user))
+        db.session.add(Budget(amount=50000.0, user=user))
+        users.append(user)
+    db.session.commit()
+    return [user.id for user in users]
+
+def generate_expense_rows(user_ids, count, months=24, seed=1):
+    """
+    Yield `count` random expense rows spread over the last `months` months
+    (inside an app context, as the categories are looked up by name)
+    """
+    from categories import category_ids
+
+    ids = category_ids(CATEGORIES)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = months * 30 * 24 * 3600
+    for _ in range(count):
+        category = rng.choice(CATEGORIES)
+        yield {
+            'description': category,
+            'amount': round(rng.uniform(10, 5000), 2),
+            'category_id': ids[category],
+            'date': now - timedelta(seconds=rng.randrange(span)),
+            'user_id': rng.choice(user_ids),
+        }
+
+def generate_income_rows(user_ids, count, months=24, seed=2):
+    """Yield `count` random income rows spread over the last `months` months"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = months * 30 * 24 * 3600
+    for _ in range(count):
+        yield {
+            'description': 'Salary',
+            'amount': round(rng.uniform(1000, 100000), 2),
+            'date': now - timedelta(seconds=rng.randrange(span)),
+            'user_id': rng.choice(user_ids),
+        }
+
+def bulk_insert(db, table, rows, batch_size=20000):
+    """Insert an iterable of row dicts with executemany in batches"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+    db.session.commit()
+
+def time_call(fn, repeat=5):
+    """Run `fn` `repeat` times and return the wall times in seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def format_stats(samples):
+    """Format timing samples as a short millisecond summary"""
+    return (f"min {min(samples) * 1000:8.2f} ms  "
+            f"p50 {statistics.median(samples) * 1000:8.2f} ms  "
+            f"max {max(samples) * 1000:8.2f} ms")
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (Linux reports KiB)"""
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_isolated(module, *args):
+    """
+    Run `python -m module args...` in a fresh interpreter and return its last
+    output line. Used so each case gets its own peak-RSS measurement.
+    """
+    import subprocess
+    import sys
+    result = subprocess.run([sys.executable, '-m', module, *map(str, args)],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
@@ -0,0 +1,164 @@
+"""Requests/sec under gunicorn at increasing worker counts
+
+    python -m benchmarks.load_test --workers 1 2 4 8 --clients 16 --duration 10
+    python -m benchmarks.load_test --profile legacy   # rollback journal, synchronous=FULL
+
+Each run starts gunicorn on a fresh temporary SQLite database (or on
+--database-url) and drives it from client threads: mostly dashboard reads,
+with a share of expense writes for one user.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import CATEGORIES, percentile, remove_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Environment overrides for each SQLite profile; 'tuned' is the app's default
+PROFILES = {
+    'tuned': {},
+    'legacy': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+    },
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(base, path, cookie, body=None):
+    """Send one request and return (status, seconds)"""
+    headers = {'Cookie': cookie}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base + path, data=data, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start
+
+def session_cookie(base):
+    """
+    Visit the index page, which creates the default user and sets its session
+    cookie. The cookie is set even when the page template isn't deployed.
+    """
+    try:
+        response = urllib.request.urlopen(base + '/')
+    except urllib.error.HTTPError as e:
+        response = e
+    with response:
+        return response.headers['Set-Cookie'].split(';')[0]
+
+def client(base, cookie, deadline, write_ratio, seed, results):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            status, elapsed = request(base, '/api/expenses', cookie, {
+                'amount': rng.randint(100, 50_000) / 100, 'category': rng.choice(CATEGORIES)
+            })
+        else:
+            status, elapsed = request(base, '/api/user-data', cookie)
+        latencies.append(elapsed)
+        if status != 200:
+            errors += 1
+    results.append((latencies, errors))
+
+def start_server(workers, env, port):
+    """Start gunicorn and wait until it answers"""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/cache-stats', timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+def run(workers, args):
+    db_path = None
+    env = dict(os.environ, **PROFILES[args.profile])
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    else:
+        fd, db_path = tempfile.mkstemp(prefix='bench-', suffix='.db')
+        os.close(fd)
+        env['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    # Create the schema once up front rather than racing in every worker
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'upgrade-db'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+    port = free_port()
+    server = start_server(workers, env, port)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        cookie = session_cookie(base)
+        for _ in range(args.seed_expenses):
+            request(base, '/api/expenses', cookie, {'amount': 12.5, 'category': 'Food'})
+
+        results = []
+        deadline = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=client, args=(base, cookie, deadline, args.write_ratio, seed, results))
+            for seed in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+        if db_path:
+            remove_database(db_path)
+
+    latencies = [latency for samples, _ in results for latency in samples]
+    errors = sum(count for _, count in results)
+    print(f"  {workers:>2} workers  {len(latencies) / args.duration:8.1f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.1f} ms  {errors} errors")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--seed-expenses', type=int, default=200)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='tuned')
+    parser.add_argument('--database-url', help='run against this database instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    print(f"profile {args.profile}, {args.clients} clients, {args.write_ratio:.0%} writes:")
+    for workers in args.workers:
+        run(workers, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Hammer one user's balance from many threads and check that no update is lost
+
+    python -m benchmarks.stress_balance --threads 16 --ops 200
+
+Each thread adds expenses, adds income and deletes some of its expenses with
+returnToBalance through the API. The final balance must equal the starting
+balance plus the sum of every successful change; exits non-zero otherwise.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.common import CATEGORIES, load_app, remove_database, create_users
+
+def worker(app, user_id, ops, seed, results):
+    """Run `ops` random balance-changing requests, recording the expected delta"""
+    rng = random.Random(seed)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    delta = Decimal('0')
+    failures = 0
+    expense_ids = []
+    for _ in range(ops):
+        amount = Decimal(rng.randint(1, 100_000)) / 100
+        choice = rng.random()
+        if choice < 0.5:
+            response = client.post('/api/expenses', json={
+                'amount': str(amount), 'category': rng.choice(CATEGORIES)
+            })
+            if response.status_code == 200:
+                expense_ids.append((response.json['id'], amount))
+                delta -= amount
+        elif choice < 0.8 or not expense_ids:
+            response = client.post('/api/income', json={'amount': str(amount)})
+            if response.status_code == 200:
+                delta += amount
+        else:
+            expense_id, amount = expense_ids.pop(rng.randrange(len(expense_ids)))
+            response = client.delete(f'/api/expenses/{expense_id}', json={'returnToBalance': True})
+            if response.status_code == 200:
+                delta += amount
+        if response.status_code != 200:
+            failures += 1
+    results.append((delta, failures))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200, help='requests per thread')
+    args = parser.parse_args()
+
+    app, db, db_path = load_app()
+    try:
+        with app.app_context():
+            from models import Balance
+            user_id = create_users(db, 1)[0]
+            start_balance = db.session.scalars(
+                db.select(Balance.amount).where(Balance.user_id == user_id)
+            ).one()
+
+        results = []
+        threads = [
+            threading.Thread(target=worker, args=(app, user_id, args.ops, seed, results))
+            for seed in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            final_balance = db.session.scalars(
+                db.select(Balance.amount).where(Balance.user_id == user_id)
+            ).one()
+            db.engine.dispose()
+
+        expected = start_balance + sum(delta for delta, _ in results)
+        failures = sum(count for _, count in results)
+        requests = args.threads * args.ops
+        print(f"{requests} requests from {args.threads} threads in {elapsed:.1f}s "
+              f"({requests / elapsed:.0f} req/s, {failures} failed)")
+        print(f"expected balance {expected}, actual {final_balance}")
+        if final_balance != expected:
+            print(f"LOST UPDATES: off by {final_balance - expected}")
+            sys.exit(1)
+        print("OK")
+    finally:
+        remove_database(db_path, app, db)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Latency, throughput and peak memory of the main endpoints on synthetic data
+
+    python -m benchmarks.suite --users 10 --expenses 100000 --incomes 5000
+    python -m benchmarks.suite --endpoints user-data export-csv --requests 50
+    python -m benchmarks.suite --gunicorn 4 --concurrency 8
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --baseline baseline.json --tolerance 0.2
+
+Every endpoint runs in its own interpreter against the same seeded temporary
+database, so peak RSS is per endpoint. With --gunicorn N the requests go over
+HTTP to a local gunicorn with N workers instead (memory is not measured).
+--baseline exits non-zero when any p95 is more than --tolerance slower.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import (CATEGORIES, load_app, remove_database, create_users, generate_expense_rows,
+                               generate_income_rows, bulk_insert, percentile, peak_rss_mb,
+                               run_isolated)
+
+def csv_upload(rows):
+    """An export-shaped CSV file with `rows` expenses"""
+    lines = ['ID,Description,Amount,Category,Date']
+    for i in range(rows):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        lines.append(f'{i},{category} {i},{i % 5000 + 0.5},{category},2026-{i % 12 + 1:02d}-15')
+    return '\n'.join(lines).encode()
+
+def excel_upload(rows):
+    """An export-shaped workbook with `rows` expenses"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Expenses')
+    ws.append(['ID', 'Description', 'Amount', 'Category', 'Date'])
+    for i in range(rows):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        ws.append([i, f'{category} {i}', i % 5000 + 0.5, category, f'2026-{i % 12 + 1:02d}-15'])
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+# name -> (method, path, upload builder or None). Uploads get --import-rows rows.
+ENDPOINTS = {
+    'user-data': ('GET', '/api/user-data', None),
+    'user-data-columnar': ('GET', '/api/user-data?layout=columnar', None),
+    'expenses': ('GET', '/api/expenses', None),
+    'expenses-page': ('GET', '/api/expenses?limit=100&includeTotal=1', None),
+    'search': ('GET', '/api/expenses/search?q=foo&limit=100', None),
+    'trends': ('GET', '/api/trends?months=24', None),
+    'recurring': ('GET', '/api/recurring', None),
+    'export-csv': ('GET', '/api/export/csv', None),
+    'export-excel': ('GET', '/api/export/excel', None),
+    'import-csv': ('POST', '/api/import/csv', ('import.csv', csv_upload)),
+    'import-excel': ('POST', '/api/import/excel', ('import.xlsx', excel_upload)),
+}
+
+def seed(db, args):
+    """Fill the database with synthetic users, expenses and income; returns user ids"""
+    from models import Expense, Income
+    from rollups import rebuild_monthly_summaries
+    from recurring import rebuild_recurring_series
+
+    # The last user receives the imports, so reads always see the same data
+    user_ids = create_users(db, args.users + 1)
+    readers = user_ids[:-1]
+    bulk_insert(db, Expense.__table__, generate_expense_rows(readers, args.expenses * args.users))
+    bulk_insert(db, Income.__table__, generate_income_rows(readers, args.incomes * args.users))
+    rebuild_monthly_summaries()
+    rebuild_recurring_series()
+    db.session.commit()
+    return user_ids
+
+def summarize(latencies, elapsed, **extra):
+    return {
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'throughput': len(latencies) / elapsed,
+        **extra,
+    }
+
+def drive(send, requests, concurrency):
+    """Call `send()` `requests` times from `concurrency` threads; returns (latencies, errors, elapsed)"""
+    latencies, errors = [], []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            ok = send()
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                if not ok:
+                    errors.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors), time.perf_counter() - started
+
+def run_endpoint(args):
+    """Child process: benchmark one endpoint through the test client and print JSON"""
+    app, db, _ = load_app(args.db)
+    method, path, upload = ENDPOINTS[args.endpoint]
+    user_id = args.import_user_id if upload else args.user_id
+    body = upload[1](args.import_rows) if upload else None
+
+    def send():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        if upload:
+            response = client.post(path, content_type='multipart/form-data',
+                                   data={'file': (io.BytesIO(body), upload[0])})
+        else:
+            response = client.open(path, method=method)
+        # Streamed responses only do their work when consumed
+        for _ in response.response:
+            pass
+        response.close()
+        return response.status_code == 200
+
+    send()  # warm-up: imports, first queries, caches sized
+    baseline_rss = peak_rss_mb()
+    latencies, errors, elapsed = drive(send, args.requests, args.concurrency)
+    print(json.dumps(summarize(latencies, elapsed, errors=errors,
+                               peak_rss_mb=peak_rss_mb(),
+                               rss_growth_mb=peak_rss_mb() - baseline_rss)))
+
+def run_over_http(args, db_path, user_ids):
+    """Benchmark every endpoint against a local gunicorn; returns {endpoint: stats}"""
+    import urllib.request
+    from benchmarks.load_test import free_port, start_server
+
+    app, _, _ = load_app(db_path)
+    serializer = app.session_interface.get_signing_serializer(app)
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    port = free_port()
+    server = start_server(args.gunicorn, env, port)
+    results = {}
+    try:
+        for name in args.endpoints:
+            method, path, upload = ENDPOINTS[name]
+            user_id = user_ids[-1] if upload else user_ids[0]
+            headers = {'Cookie': f"{app.config.get('SESSION_COOKIE_NAME', 'session')}="
+                                 f"{serializer.dumps({'user_id': user_id})}"}
+            data = None
+            if upload:
+                boundary = 'benchmarkboundary'
+                headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+                data = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                        f'filename="{upload[0]}"\r\n\r\n').encode() + upload[1](args.import_rows) + \
+                       f'\r\n--{boundary}--\r\n'.encode()
+
+            def send():
+                request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data,
+                                                 headers=headers, method=method)
+                try:
+                    with urllib.request.urlopen(request, timeout=300) as response:
+                        response.read()
+                        return response.status == 200
+                except OSError:
+                    return False
+
+            send()
+            latencies, errors, elapsed = drive(send, args.requests, args.concurrency)
+            results[name] = summarize(latencies, elapsed, errors=errors)
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+def print_report(results, baseline, tolerance):
+    """Print one line per endpoint; returns the endpoints that regressed"""
+    regressions = []
+    print(f"{'endpoint':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+          f"{'peak MiB':>9} {'errors':>6}")
+    for name, stats in results.items():
+        rss = f"{stats['peak_rss_mb']:9.0f}" if 'peak_rss_mb' in stats else f"{'-':>9}"
+        line = (f"{name:<20} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} "
+                f"{stats['throughput']:8.1f} {rss} {stats['errors']:6}")
+        previous = baseline.get(name)
+        if previous:
+            change = stats['p95_ms'] / previous['p95_ms'] - 1
+            line += f"  p95 {change:+.0%}"
+            if change > tolerance:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--expenses', type=int, default=10_000, help='expenses per user')
+    parser.add_argument('--incomes', type=int, default=500, help='incomes per user')
+    parser.add_argument('--import-rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS', help='drive a local gunicorn over HTTP')
+    parser.add_argument('--save', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare p95 latencies with a file written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--endpoint', choices=list(ENDPOINTS), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--import-user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.endpoint:
+        run_endpoint(args)
+        return
+
+    app, db, db_path = load_app()
+    try:
+        print(f"Seeding {args.users} users x {args.expenses} expenses, {args.incomes} incomes...")
+        with app.app_context():
+            user_ids = seed(db, args)
+            db.engine.dispose()
+
+        if args.gunicorn:
+            results = run_over_http(args, db_path, user_ids)
+        else:
+            results = {}
+            for name in args.endpoints:
+                line = run_isolated('benchmarks.suite', '--endpoint', name, '--db', db_path,
+                                    '--user-id', user_ids[0], '--import-user-id', user_ids[-1],
+                                    '--requests', args.requests, '--concurrency', args.concurrency,
+                                    '--import-rows', args.import_rows)
+                results[name] = json.loads(line)
+    finally:
+        remove_database(db_path, app, db)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = print_report(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"\np95 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
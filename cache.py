@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class CacheStats:
+    """Thread-safe hit/miss/eviction counters"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def record(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+    
+    def to_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': self.hits / total if total else 0
+            }
+
+class TTLCache:
+    """
+    A small in-process LRU cache whose entries also expire after `ttl` seconds.
+    Each gunicorn worker has its own copy, so the TTL bounds how stale another
+    worker's entry can be after a write.
+    """
+    
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def configure(self, maxsize, ttl):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._entries.clear()
+    
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats.record('misses')
+                return None
+            self._entries.move_to_end(key)
+            self.stats.record('hits')
+            return entry[1]
+    
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.record('evictions')
+    
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+    
+    def __len__(self):
+        return len(self._entries)
+
+# /api/user-data payloads keyed by (user_id, data_version, year, month)
+user_data_cache = TTLCache()
+
+# Per-request memoization of get_current_user (a miss per request, a hit per repeat call in it)
+current_user_stats = CacheStats()
+
+def invalidate_user_data(user_id):
+    """Forget cached payloads for a user after any write to their data"""
+    user_data_cache.invalidate(lambda key: key[0] == user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    # utils.mark_data_changed records the users written in this transaction
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user_data(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+def cache_stats():
+    """Counters for monitoring"""
+    return {
+        'userData': {**user_data_cache.stats.to_dict(), 'size': len(user_data_cache)},
+        'currentUser': current_user_stats.to_dict()
+    }
@@ -0,0 +1,125 @@
+import threading
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from models import Category
+
+class CategoryCache:
+    """
+    Per-process name <-> id maps of the category table. Categories are only
+    ever added, never renamed or deleted, so entries can't go stale; a miss
+    is read from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = {}
+        self.names = {}
+
+    def remember(self, pairs):
+        with self._lock:
+            for category_id, name in pairs:
+                self.ids[name] = category_id
+                self.names[category_id] = name
+
+    def __len__(self):
+        return len(self.ids)
+
+    def snapshot(self):
+        """A copy of the id -> name map, safe to iterate while others add to it"""
+        with self._lock:
+            return dict(self.names)
+
+category_cache = CategoryCache()
+
+def _pending():
+    """{name: id} of categories created in the session's open transaction"""
+    return db.session.info.setdefault('new_categories', {})
+
+def _insert_missing(names):
+    """INSERT the names, skipping any another transaction has added meanwhile"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    db.session.execute(
+        dialect.insert(Category).on_conflict_do_nothing(index_elements=['name']),
+        [{'name': name} for name in names]
+    )
+
+def category_ids(names, create=True):
+    """
+    {name: id} for `names`. Unknown names are inserted in the current
+    transaction when `create`, and otherwise left out.
+    """
+    names = set(names)
+    ids = {name: category_cache.ids[name] for name in names if name in category_cache.ids}
+    pending = _pending()
+    ids.update((name, pending[name]) for name in names - ids.keys() if name in pending)
+
+    missing = names - ids.keys()
+    if missing:
+        rows = db.session.execute(select(Category.id, Category.name).where(Category.name.in_(missing))).all()
+        category_cache.remember(rows)
+        ids.update((name, category_id) for category_id, name in rows)
+        missing -= ids.keys()
+
+    if missing and create:
+        _insert_missing(missing)
+        rows = db.session.execute(select(Category.id, Category.name).where(Category.name.in_(missing))).all()
+        # Shared with other requests only once the transaction commits
+        pending.update((name, category_id) for category_id, name in rows)
+        ids.update(pending)
+
+    return {name: ids[name] for name in names if name in ids}
+
+def category_id(name, create=True):
+    """The id of one category name; None for an unknown name when not `create`"""
+    return category_ids([name], create).get(name)
+
+def category_names(ids):
+    """{id: name} for category ids"""
+    ids = set(ids)
+    names = {category_id: category_cache.names[category_id]
+             for category_id in ids if category_id in category_cache.names}
+    missing = ids - names.keys()
+    if missing:
+        pending = {category_id: name for name, category_id in _pending().items()}
+        names.update((category_id, pending[category_id]) for category_id in missing if category_id in pending)
+        missing -= names.keys()
+    if missing:
+        rows = db.session.execute(select(Category.id, Category.name).where(Category.id.in_(missing))).all()
+        category_cache.remember(rows)
+        names.update(rows)
+    return names
+
+def all_category_names():
+    """
+    {id: name} of every category. The cache is filled from the table the
+    first time, and again only when other processes have added categories
+    since; otherwise this costs one count of the (small) table.
+    """
+    pending = _pending()
+    committed = db.session.scalar(select(func.count()).select_from(Category)) - len(pending)
+    if committed != len(category_cache):
+        category_cache.remember(db.session.execute(
+            select(Category.id, Category.name).where(Category.id.not_in(list(pending.values())))
+        ).all())
+    names = category_cache.snapshot()
+    names.update((category_id, name) for name, category_id in pending.items())
+    return names
+
+def intern_categories(rows):
+    """Replace the 'category' name of each row dict with its 'category_id', creating new categories"""
+    ids = category_ids({row['category'] for row in rows})
+    for row in rows:
+        row['category_id'] = ids[row.pop('category')]
+    return rows
+
+@event.listens_for(Session, 'after_commit')
+def _share_new_categories(session):
+    new_categories = session.info.pop('new_categories', None)
+    if new_categories:
+        category_cache.remember((category_id, name) for name, category_id in new_categories.items())
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_new_categories(session):
+    session.info.pop('new_categories', None)
@@ -162,48 +162,31 @@ function initializeTrendChart() {
     });
 }
 
-function updateTrendChart() {
+function updateTrendChart(months = 12) {
     if (!trendChart) return;
     
-    // Group expenses by month
-    const monthlyTotals = {};
-    const months = [];
     const monthNames = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
     
-    userData.expenses.forEach(expense => {
-        const date = new Date(expense.date);
-        const monthYear = `${date.getFullYear()}-${date.getMonth() + 1}`;
-        const displayMonth = `${monthNames[date.getMonth()]} ${date.getFullYear()}`;
-        
-        if (!months.includes(displayMonth)) {
-            months.push(displayMonth);
-        }
-        
-        if (monthlyTotals[monthYear]) {
-            monthlyTotals[monthYear].total += expense.amount;
-        } else {
-            monthlyTotals[monthYear] = {
-                total: expense.amount,
-                display: displayMonth
-            };
-        }
-    });
-    
-    // Sort months chronologically
-    const sortedMonths = Object.keys(monthlyTotals).sort();
-    const labels = sortedMonths.map(month => monthlyTotals[month].display);
-    const data = sortedMonths.map(month => monthlyTotals[month].total);
-    
-    if (labels.length < 2) {
-        if ($('noTrendData')) $('noTrendData').classList.remove('d-none');
-        return;
-    }
-    
-    if ($('noTrendData')) $('noTrendData').classList.add('d-none');
-    
-    trendChart.data.labels = labels;
-    trendChart.data.datasets[0].data = data;
-    trendChart.update();
+    // Monthly totals are aggregated on the server, oldest month first
+    fetch(`/api/trends?months=${months}`)
+        .then(response => response.json())
+        .then(points => {
+            const monthsWithSpending = points.filter(point => point.total > 0);
+            
+            if (monthsWithSpending.length < 2) {
+                if ($('noTrendData')) $('noTrendData').classList.remove('d-none');
+                return;
+            }
+            
+            if ($('noTrendData')) $('noTrendData').classList.add('d-none');
+            
+            trendChart.data.labels = points.map(point => `${monthNames[point.month - 1]} ${point.year}`);
+            trendChart.data.datasets[0].data = points.map(point => point.total);
+            trendChart.update();
+        })
+        .catch(error => {
+            console.error('Error loading trend data:', error);
+        });
 }
 
 // Category Bar Chart
@@ -0,0 +1,38 @@
+import click
+from migrations import upgrade_database
+from app import db
+from rollups import rebuild_monthly_summaries
+from recurring import rebuild_recurring_series
+from archive import archive_expenses, closed_month_cutoff
+
+def register_commands(app):
+    
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Create missing tables and apply pending migrations"""
+        upgrade_database()
+        click.echo('Database is up to date.')
+    
+    @app.cli.command('rebuild-summaries')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+    def rebuild_summaries(user_id):
+        """Recompute the monthly summaries and recurring series from the expense table"""
+        rebuild_monthly_summaries(user_id)
+        rebuild_recurring_series(user_id)
+        db.session.commit()
+        click.echo('Monthly summaries and recurring series rebuilt.')
+    
+    @app.cli.command('archive-expenses')
+    @click.option('--keep-months', type=int, default=12, show_default=True,
+                  help='Closed months to keep in the expense table besides the current one')
+    @click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Archive expenses dated before this first-of-month instead')
+    @click.option('--user-id', type=int, default=None, help='Only archive this user')
+    def archive_expenses_command(keep_months, before, user_id):
+        """Move expenses from closed months to the archive table"""
+        before = before or closed_month_cutoff(keep_months)
+        try:
+            moved = archive_expenses(before, user_id)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--before')
+        click.echo(f'Archived {moved} expenses dated before {before:%Y-%m-%d}.')
@@ -0,0 +1,40 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+def engine_options(config):
+    """
+    SQLAlchemy engine options for the configured database. Pool settings only
+    apply to server databases; a local SQLite file needs no liveness pings.
+    """
+    if make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == 'sqlite':
+        return {"pool_pre_ping": False}
+
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+def configure_engine(engine, config):
+    """Apply the SQLite pragmas from the config to every new connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = [
+        # WAL lets readers carry on while one worker writes
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        # NORMAL only fsyncs at checkpoints, which is safe in WAL mode
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        # Wait for another worker's write lock instead of failing with "database is locked"
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
@@ -110,7 +110,8 @@ function importFile(file, type) {
     const formData = new FormData();
     formData.append('file', file);
     
-    const endpoint = type === 'csv' ? '/api/import/csv' : '/api/import/excel';
+    // Imports run as background jobs on the server; poll until they finish
+    const endpoint = type === 'csv' ? '/api/import/csv?async=1' : '/api/import/excel?async=1';
     
     fetch(endpoint, {
         method: 'POST',
@@ -118,33 +119,9 @@ function importFile(file, type) {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            showNotification(`Successfully imported ${data.importedCount} expenses totaling ₹${data.totalAmount.toFixed(2)}`);
-            
-            // Update balance and budget progress
-            // Handle balance - might be a number or an object
-            if (typeof data.balance === 'number') {
-                userData.balance = { amount: data.balance };
-            } else {
-                userData.balance = data.balance;
-            }
-            userData.budgetProgress = data.budgetProgress;
-            
-            // Update UI directly
-            updateBalanceDisplay();
-            updateBudgetDisplay();
-            
-            // Get all expenses after import
-            fetch('/api/expenses')
-                .then(response => response.json())
-                .then(expenses => {
-                    userData.expenses = expenses;
-                    updateExpenseTable();
-                    updateAllCharts();
-                })
-                .catch(error => {
-                    console.error('Error loading expenses after import:', error);
-                });
+        if (data.success && data.jobId) {
+            showNotification('Import started. Your expenses will appear once it finishes.', 'info');
+            pollImportJob(data.jobId, type);
         } else {
             showNotification('Import failed: ' + (data.error || 'Unknown error'), 'danger');
         }
@@ -154,3 +131,54 @@ function importFile(file, type) {
         showNotification(`Failed to import expenses from ${type.toUpperCase()} file. Please try again.`, 'danger');
     });
 }
+
+// Poll an import job until it completes or fails
+function pollImportJob(jobId, type, interval = 1000) {
+    fetch(`/api/import/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'queued' || job.status === 'running') {
+                setTimeout(() => pollImportJob(jobId, type, interval), interval);
+            } else if (job.status === 'completed') {
+                handleImportSuccess(job);
+            } else {
+                showNotification('Import failed: ' + (job.error || 'Unknown error'), 'danger');
+            }
+        })
+        .catch(error => {
+            console.error('Error checking import job:', error);
+            showNotification(`Failed to import expenses from ${type.toUpperCase()} file. Please try again.`, 'danger');
+        });
+}
+
+// Update the UI after a successful import
+function handleImportSuccess(data) {
+    let message = `Successfully imported ${data.importedCount} expenses totaling ₹${data.totalAmount.toFixed(2)}`;
+    if (data.rejectedCount) {
+        message += ` (${data.rejectedCount} invalid rows skipped)`;
+        console.warn('Rejected import rows:', data.rejected);
+    }
+    showNotification(message);
+    
+    // Update balance and budget progress
+    // Handle balance - might be a number or an object
+    if (typeof data.balance === 'number') {
+        userData.balance = { amount: data.balance };
+    } else {
+        userData.balance = data.balance;
+    }
+    userData.budgetProgress = data.budgetProgress;
+    
+    // Update UI directly
+    updateBalanceDisplay();
+    updateBudgetDisplay();
+    
+    // Reload the most recent expenses after import
+    showExpensesPage()
+        .then(() => {
+            updateAllCharts();
+        })
+        .catch(error => {
+            console.error('Error loading expenses after import:', error);
+        });
+}
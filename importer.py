@@ -0,0 +1,163 @@
+import csv
+import io
+import time
+from datetime import datetime
+from itertools import islice
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from app import db
+from models import Expense
+from money import parse_amount
+from categories import intern_categories
+from rollups import row_deltas, apply_summary_deltas
+from recurring import series_added
+from utils import adjust_balance, mark_data_changed
+
+# Column limits from models.Expense
+MAX_DESCRIPTION_LENGTH = 120
+MAX_CATEGORY_LENGTH = 50
+
+class ImportTooLarge(ValueError):
+    """Raised when an upload has more rows than IMPORT_MAX_ROWS allows"""
+
+def read_csv_rows(stream):
+    """Yield the data rows of a binary CSV stream, skipping the header"""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    next(reader, None)
+    yield from reader
+
+def read_excel_rows(source, max_rows=None):
+    """
+    Yield the data rows of the active sheet of a workbook, skipping the header.
+    The workbook is opened read-only, so rows are parsed from the file as they
+    are consumed instead of building the whole object model in memory.
+    """
+    wb = load_workbook(filename=source, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        
+        # Fail fast when the sheet declares more rows than we accept
+        if max_rows and ws.max_row and ws.max_row - 1 > max_rows:
+            raise ImportTooLarge(f'File has more than {max_rows} rows')
+        
+        yield from ws.iter_rows(min_row=2, values_only=True)
+    finally:
+        wb.close()
+
+def parse_date(value, default):
+    """Parse an imported date cell; unparseable dates fall back to `default` like manual entries"""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return default
+    try:
+        return datetime.strptime(str(value).strip()[:10], '%Y-%m-%d')
+    except ValueError:
+        return default
+
+def parse_rows(rows, user_id, first_row_number, now):
+    """
+    Validate a chunk of raw rows (ID, Description, Amount, Category[, Date]).
+    Returns the insertable row dicts and a list of {'row', 'error'} rejects.
+    """
+    parsed = []
+    rejects = []
+    
+    for row_number, row in enumerate(rows, first_row_number):
+        # Blank lines are not rejects
+        if all(cell is None or cell == '' for cell in row):
+            continue
+        if len(row) < 4:
+            rejects.append({'row': row_number, 'error': 'Expected at least 4 columns'})
+            continue
+        
+        try:
+            amount = parse_amount(row[2])
+        except ValueError as e:
+            rejects.append({'row': row_number, 'error': str(e)})
+            continue
+        
+        category = str(row[3]).strip() if row[3] is not None else ''
+        if not category:
+            rejects.append({'row': row_number, 'error': 'Missing category'})
+            continue
+        if len(category) > MAX_CATEGORY_LENGTH:
+            rejects.append({'row': row_number, 'error': 'Category is too long'})
+            continue
+        
+        # Fall back to the category, as manual entries do
+        description = str(row[1]).strip() if row[1] is not None else ''
+        
+        parsed.append({
+            'description': (description or category)[:MAX_DESCRIPTION_LENGTH],
+            'amount': amount,
+            'category': category,
+            'date': parse_date(row[4] if len(row) > 4 else None, now),
+            'user_id': user_id
+        })
+    
+    return parsed, rejects
+
+def import_expenses(user, rows, batch_size=1000, max_rejects=100, first_row_number=2,
+                    progress=None, max_rows=None):
+    """
+    Bulk-insert expense rows for a user in batches of `batch_size`.
+    The balance and monthly summaries are adjusted once at the end and the
+    whole import is committed as one transaction. `progress`, if given, is
+    called after every batch with (rows_processed, imported, rejected).
+    Raises ImportTooLarge (nothing is committed) past `max_rows` rows.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    rows = iter(rows)
+    
+    imported_count = 0
+    total_amount = 0
+    rejects = []
+    rejected_count = 0
+    deltas = None
+    row_number = first_row_number
+    
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        
+        parsed, chunk_rejects = parse_rows(chunk, user.id, row_number, now)
+        row_number += len(chunk)
+        
+        if max_rows and row_number - first_row_number > max_rows:
+            db.session.rollback()
+            raise ImportTooLarge(f'File has more than {max_rows} rows')
+        
+        if parsed:
+            intern_categories(parsed)
+            db.session.execute(insert(Expense.__table__), parsed)
+            imported_count += len(parsed)
+            total_amount += sum(row['amount'] for row in parsed)
+            deltas = row_deltas(((r['category_id'], r['date'], r['amount']) for r in parsed),
+                                deltas=deltas)
+            series_added(user.id, ((r['description'], r['category_id'], r['date'], r['amount'])
+                                   for r in parsed))
+        
+        rejected_count += len(chunk_rejects)
+        rejects.extend(chunk_rejects[:max_rejects - len(rejects)])
+        
+        if progress:
+            progress(row_number - first_row_number, imported_count, rejected_count)
+    
+    adjust_balance(user, -total_amount)
+    
+    if deltas:
+        apply_summary_deltas(user.id, deltas)
+    mark_data_changed(user.id)
+    db.session.commit()
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'importedCount': imported_count,
+        'totalAmount': total_amount,
+        'rejectedCount': rejected_count,
+        'rejected': rejects,
+        'rowsPerSecond': round((row_number - first_row_number) / elapsed) if elapsed > 0 else 0
+    }
@@ -0,0 +1,254 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class RequestMetrics:
+    """
+    Thread-safe per-route counters, rendered in the Prometheus text format.
+    Like the caches, every gunicorn worker keeps its own numbers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)    # (route, method, status) -> count
+        self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.duration_sum = defaultdict(float)
+        self.duration_count = defaultdict(int)
+        self.statements = defaultdict(int)
+        self.statement_seconds = defaultdict(float)
+        self.objects_loaded = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+
+    def record(self, route, method, status, duration, statements, statement_seconds,
+               objects_loaded, response_bytes):
+        key = (route, method)
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            buckets = self.buckets[key]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.duration_sum[key] += duration
+            self.duration_count[key] += 1
+            self.statements[key] += statements
+            self.statement_seconds[key] += statement_seconds
+            self.objects_loaded[key] += objects_loaded
+            self.response_bytes[key] += response_bytes
+
+    def add_response_bytes(self, route, method, amount):
+        """Count bytes of a streamed body, which are only known as it is sent"""
+        with self._lock:
+            self.response_bytes[(route, method)] += amount
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def family(name, kind, help_text, values, label_names=('route', 'method')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{{{_labels(zip(label_names, labels))}}} {value}')
+
+        with self._lock:
+            family('http_requests_total', 'counter', 'Requests handled, by route, method and status.',
+                   self.requests, ('route', 'method', 'status'))
+
+            lines.append('# HELP http_request_duration_seconds Wall time from request start to the end of the response.')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for key in sorted(self.buckets):
+                labels = list(zip(('route', 'method'), key))
+                for bound, count in zip(DURATION_BUCKETS, self.buckets[key]):
+                    lines.append(f'http_request_duration_seconds_bucket{{{_labels(labels + [("le", bound)])}}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{_labels(labels + [("le", "+Inf")])}}} '
+                             f'{self.duration_count[key]}')
+                lines.append(f'http_request_duration_seconds_sum{{{_labels(labels)}}} {self.duration_sum[key]}')
+                lines.append(f'http_request_duration_seconds_count{{{_labels(labels)}}} {self.duration_count[key]}')
+
+            family('db_statements_total', 'counter', 'SQL statements executed while handling requests.',
+                   self.statements)
+            family('db_statement_seconds_total', 'counter', 'Time spent executing SQL statements.',
+                   self.statement_seconds)
+            family('orm_objects_loaded_total', 'counter', 'ORM instances hydrated from query results.',
+                   self.objects_loaded)
+            family('http_response_bytes_total', 'counter', 'Response body bytes sent.',
+                   self.response_bytes)
+        return '\n'.join(lines) + '\n'
+
+def _labels(pairs):
+    """Format (name, value) pairs as Prometheus labels, escaping the values"""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+request_metrics = RequestMetrics()
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more SQL statements than its budget (QUERY_BUDGET_STRICT mode, under app.testing)"""
+
+def query_budget(limit):
+    """
+    Override QUERY_BUDGET for one view; None means unlimited (for imports and
+    exports whose statement count grows with the data by design)
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+def _request_stats():
+    """The per-request counters, or None outside an instrumented request"""
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+def _count_bytes(chunks, route, method):
+    """Pass a streamed body through, counting its bytes"""
+    try:
+        for chunk in chunks:
+            request_metrics.add_response_bytes(route, method, len(chunk))
+            yield chunk
+    finally:
+        # Closing the wrapped body is what ends a stream_with_context request
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def init_instrumentation(app, db):
+    """
+    Hook request timing, SQL and ORM counters, slow-request profiling and the
+    query budget into the app when METRICS_ENABLED, PROFILE_SLOW_MS or
+    QUERY_BUDGET is set. Does nothing otherwise.
+    """
+    metrics_enabled = app.config['METRICS_ENABLED']
+    slow_seconds = app.config['PROFILE_SLOW_MS'] / 1000
+    default_budget = app.config['QUERY_BUDGET']
+    if not metrics_enabled and not slow_seconds and not default_budget:
+        return
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append((context, time.perf_counter()))
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        stats = _request_stats()
+        if stats is not None:
+            stats['statements'] += 1
+            stats['statement_seconds'] += elapsed
+            if default_budget:
+                stats['statement_counts'][statement] += 1
+
+    @event.listens_for(db.engine, 'handle_error')
+    def handle_error(exception_context):
+        # after_cursor_execute never runs for a statement that raised
+        conn = exception_context.connection
+        started = conn.info.get('query_started') if conn is not None else None
+        if started and started[-1][0] is exception_context.execution_context:
+            started.pop()
+
+    @event.listens_for(db.Model, 'load', propagate=True)
+    def instance_loaded(target, context):
+        stats = _request_stats()
+        if stats is not None:
+            stats['objects_loaded'] += 1
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = {'started': time.perf_counter(), 'statements': 0,
+                           'statement_seconds': 0.0, 'objects_loaded': 0,
+                           'statement_counts': Counter()}
+        if slow_seconds and random.random() < app.config['PROFILE_SAMPLE_RATE']:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def note_response(response):
+        stats = g.get('request_stats')
+        if stats is not None:
+            stats['status'] = response.status_code
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            if response.is_streamed:
+                stats['response_bytes'] = 0
+                response.response = _count_bytes(response.response, route, request.method)
+            else:
+                stats['response_bytes'] = response.content_length or 0
+        return response
+
+    # Streamed responses keep the request context until the body is sent, so
+    # teardown sees the SQL they run and the full duration. The query budget
+    # is checked here for the same reason.
+    @app.teardown_request
+    def finish_request_stats(exc):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+        duration = time.perf_counter() - stats['started']
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if duration >= slow_seconds:
+                _dump_profile(app, profiler, route, duration)
+
+        if metrics_enabled and route != '/metrics':
+            request_metrics.record(route, request.method, stats.get('status', 500), duration,
+                                   stats['statements'], stats['statement_seconds'],
+                                   stats['objects_loaded'], stats.get('response_bytes', 0))
+
+        if default_budget:
+            _check_query_budget(app, stats, default_budget)
+
+    if metrics_enabled:
+        @app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Per-route request metrics for this worker process, for Prometheus to scrape"""
+            return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _check_query_budget(app, stats, default_budget):
+    """
+    Warn when the request has run more statements than its view allows. The
+    most repeated statement is reported since that is usually the N+1 loop.
+    With QUERY_BUDGET_STRICT it is an error instead, raised as
+    QueryBudgetExceeded under app.testing: by teardown the response has been
+    sent and any writes committed, so only a test client can still fail on it.
+    """
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', default_budget)
+    if budget is None or stats['statements'] <= budget:
+        return
+
+    statement, repeats = stats['statement_counts'].most_common(1)[0]
+    message = (f"{request.method} {request.path} ran {stats['statements']} SQL statements "
+               f"(budget {budget}); repeated {repeats}x: {' '.join(statement.split())[:200]}")
+    if not app.config['QUERY_BUDGET_STRICT']:
+        logger.warning(message)
+    elif app.testing:
+        raise QueryBudgetExceeded(message)
+    else:
+        logger.error(message)
+
+def _dump_profile(app, profiler, route, duration):
+    """Write a slow request's profile where `python -m pstats` or snakeviz can read it"""
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    name = ''.join(c if c.isalnum() or c == '-' else '_' for c in route.strip('/')) or 'index'
+    now = time.time()
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    path = os.path.join(directory, f"{stamp}-{os.getpid()}-{name}.prof")
+    profiler.dump_stats(path)
+    logger.warning("Slow request %s %s took %.0f ms; profile written to %s",
+                   request.method, request.path, duration * 1000, path)
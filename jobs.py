@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from models import User, ImportJob
+from importer import import_expenses, read_csv_rows, read_excel_rows
+from utils import USER_CONTEXT_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Live progress of jobs running in this process, overlaid on their rows. The
+# import itself commits once at the end, so the row gets its progress from
+# separate transactions every IMPORT_PROGRESS_ROWS rows, which any worker can
+# poll.
+_progress = {}
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['IMPORT_WORKERS'],
+                                           thread_name_prefix='import-job')
+        return _executor
+
+def submit_import_job(user, kind, upload):
+    """Spool an uploaded file to disk and queue it for import, returning the job"""
+    app = current_app._get_current_object()
+    
+    suffix = '.csv' if kind == 'csv' else '.xlsx'
+    fd, path = tempfile.mkstemp(prefix='import-', suffix=suffix)
+    with os.fdopen(fd, 'wb') as spool:
+        upload.save(spool)
+    
+    job = ImportJob(user_id=user.id, kind=kind, filename=upload.filename, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    
+    _get_executor(app).submit(_run_import_job, app, job.id, path)
+    return job
+
+def _run_import_job(app, job_id, path):
+    with app.app_context():
+        # SQLite has one writer at a time, and the import holds the write lock
+        # until it commits; there the row only gets the final counts and no
+        # heartbeat, so it is never judged stale
+        save_every = app.config['IMPORT_PROGRESS_ROWS'] if db.engine.dialect.name != 'sqlite' else 0
+        saved = 0
+        
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        if save_every:
+            job.heartbeat_at = job.started_at
+        db.session.commit()
+        
+        def record_progress(processed, imported, rejected):
+            nonlocal saved
+            _progress[job_id] = {'processedRows': processed, 'importedCount': imported,
+                                 'rejectedCount': rejected}
+            if save_every and processed - saved >= save_every:
+                _save_progress(job_id, processed, imported, rejected)
+                saved = processed
+        
+        try:
+            user = db.session.get(User, job.user_id, options=USER_CONTEXT_OPTIONS)
+            with open(path, 'rb') as source:
+                max_rows = app.config['IMPORT_MAX_ROWS']
+                if job.kind == 'csv':
+                    rows = read_csv_rows(source)
+                else:
+                    rows = read_excel_rows(source, max_rows)
+                result = import_expenses(user, rows, batch_size=app.config['IMPORT_BATCH_SIZE'],
+                                         progress=record_progress, max_rows=max_rows)
+            
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'completed'
+            job.processed_rows = _progress.get(job_id, {}).get('processedRows', 0)
+            job.imported_count = result['importedCount']
+            job.rejected_count = result['rejectedCount']
+            job.total_amount = result['totalAmount']
+            job.rejected = json.dumps(result['rejected'])
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            _progress.pop(job_id, None)
+            os.remove(path)
+
+def _save_progress(job_id, processed, imported, rejected):
+    """Write a running job's progress in its own transaction, outside the import's"""
+    with db.engine.begin() as conn:
+        conn.execute(update(ImportJob).where(ImportJob.id == job_id).values(
+            processed_rows=processed, imported_count=imported, rejected_count=rejected,
+            heartbeat_at=datetime.utcnow()
+        ))
+
+def fail_stale_job(job):
+    """
+    Mark a running job failed once its heartbeat is IMPORT_JOB_STALE_SECONDS
+    old, as when the process running it died. Jobs without a heartbeat (on
+    SQLite) are left alone: their progress can't be written while they run.
+    """
+    if job.status != 'running' or job.heartbeat_at is None or job.id in _progress:
+        return
+    stale_after = timedelta(seconds=current_app.config['IMPORT_JOB_STALE_SECONDS'])
+    if datetime.utcnow() - job.heartbeat_at < stale_after:
+        return
+    
+    # Only if still running, so a job finishing meanwhile keeps its result
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job.id, ImportJob.status == 'running')
+        .values(status='failed', error='The import stopped reporting progress', finished_at=now),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.warning("Import job %s stopped reporting progress; marked failed", job.id)
+    db.session.refresh(job)
+
+def job_to_dict(job):
+    """Format a job for the API, overlaying live progress when it runs in this process"""
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'filename': job.filename,
+        'status': job.status,
+        'processedRows': job.processed_rows,
+        'importedCount': job.imported_count,
+        'rejectedCount': job.rejected_count,
+        'totalAmount': job.total_amount,
+        'rejected': json.loads(job.rejected) if job.rejected else [],
+        'error': job.error,
+        'createdAt': job.created_at.isoformat() if job.created_at else None,
+        'finishedAt': job.finished_at.isoformat() if job.finished_at else None
+    }
+    if job.status == 'running':
+        data.update(_progress.get(job.id, {}))
+    return data
@@ -10,6 +10,7 @@ const $expenseCategory = $('expenseCategory');
 const $expenseDate = $('expenseDate');
 const $expenseTable = $('expenseTable');
 const $noExpenses = $('noExpenses');
+const $loadMoreExpenses = $('loadMoreExpenses');
 const $speechFeedback = $('speechFeedback');
 const $speechText = $('speechText');
 
@@ -39,6 +40,9 @@ let userData = {
 
 let tempDeletedExpenseId = null;
 
+// Filters of the listed expenses and the cursor of the page after them (null when there are no more)
+let expenseListing = { params: {}, nextCursor: null };
+
 // Load user data on page load
 document.addEventListener('DOMContentLoaded', () => {
     loadUserData();
@@ -320,16 +324,41 @@ function addIncome(description, amount) {
 }
 
 function filterExpenses(category) {
-    const filterParam = category === 'all' ? '' : `?category=${category}`;
+    showExpensesPage(category === 'all' ? {} : { category })
+        .catch(error => {
+            console.error('Error filtering expenses:', error);
+        });
+}
+
+// Fetch one page of expenses (newest first); pass page.nextCursor as `cursor` for the next one
+function fetchExpensesPage(params = {}, limit = 200) {
+    const query = new URLSearchParams({ limit, ...params });
+    return fetch(`/api/expenses?${query}`).then(response => response.json());
+}
+
+// List the first page of expenses matching `params`, replacing the current list
+function showExpensesPage(params = {}) {
+    return fetchExpensesPage(params)
+        .then(page => {
+            expenseListing = { params, nextCursor: page.nextCursor };
+            userData.expenses = page.expenses;
+            updateExpenseTable();
+            return page;
+        });
+}
+
+// Append the next page of the current listing
+function loadMoreExpenses() {
+    if (!expenseListing.nextCursor) return;
     
-    fetch(`/api/expenses${filterParam}`)
-        .then(response => response.json())
-        .then(data => {
-            userData.expenses = data;
+    fetchExpensesPage({ ...expenseListing.params, cursor: expenseListing.nextCursor })
+        .then(page => {
+            expenseListing.nextCursor = page.nextCursor;
+            userData.expenses = userData.expenses.concat(page.expenses);
             updateExpenseTable();
         })
         .catch(error => {
-            console.error('Error filtering expenses:', error);
+            console.error('Error loading more expenses:', error);
         });
 }
 
@@ -388,6 +417,11 @@ function updateBudgetDisplay() {
 }
 
 function updateExpenseTable() {
+    // Only listings fetched a page at a time have more rows to load
+    if ($loadMoreExpenses) {
+        $loadMoreExpenses.classList.toggle('d-none', !expenseListing.nextCursor);
+    }
+    
     if (userData.expenses.length === 0) {
         $expenseTable.innerHTML = '';
         $noExpenses.classList.remove('d-none');
@@ -0,0 +1,155 @@
+import logging
+from sqlalchemy import inspect, text
+from app import db
+from models import User, Expense, Income, SchemaMigration, normalize_description
+from rollups import rebuild_monthly_summaries
+from recurring import rebuild_recurring_series
+from search import create_search_index
+
+logger = logging.getLogger(__name__)
+
+def _add_user_columns(fresh):
+    """Add the data_version column ETags and cache keys are built from, and the archive cutoff"""
+    columns = {column['name'] for column in inspect(db.engine).get_columns(User.__tablename__)}
+    table = db.engine.dialect.identifier_preparer.quote(User.__tablename__)
+    with db.engine.begin() as conn:
+        if 'data_version' not in columns:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'))
+        if 'archived_before' not in columns:
+            column_type = User.__table__.c.archived_before.type.compile(dialect=db.engine.dialect)
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN archived_before {column_type}'))
+
+# Tables whose amounts were stored as Float currency units before money became integer cents
+MONEY_COLUMNS = [
+    ('expense', 'amount'),
+    ('income', 'amount'),
+    ('balance', 'amount'),
+    ('budget', 'amount'),
+]
+
+def _convert_money_to_cents(fresh):
+    """Rewrite Float amounts as integer cents"""
+    if fresh:
+        return
+    
+    with db.engine.begin() as conn:
+        for table, column in MONEY_COLUMNS:
+            if db.engine.dialect.name == 'postgresql':
+                conn.execute(text(
+                    f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT '
+                    f'USING ROUND({column} * 100)::BIGINT'
+                ))
+            else:
+                # SQLite can't change a column's type in place; the values become
+                # whole numbers of cents, which REAL stores exactly
+                conn.execute(text(
+                    f'UPDATE {table} SET {column} = CAST(ROUND({column} * 100) AS INTEGER)'
+                ))
+
+def _intern_categories(fresh):
+    """
+    Copy every expense category name into the category table and replace
+    the category column with category_id. SQLite can't drop or retype a
+    column, so there the expense table is rebuilt from the current model;
+    the new table uses AUTOINCREMENT, and copying the ids over starts its
+    sequence past them, so ids of expenses archived later are never handed
+    out again (Postgres ids come from a sequence, which never goes back).
+    """
+    if fresh:
+        return
+    
+    table = Expense.__table__
+    with db.engine.begin() as conn:
+        conn.execute(text('INSERT INTO category (name) SELECT DISTINCT category FROM expense'))
+        if db.engine.dialect.name == 'postgresql':
+            conn.execute(text('ALTER TABLE expense ADD COLUMN category_id INTEGER REFERENCES category (id)'))
+            conn.execute(text('UPDATE expense SET category_id = category.id FROM category '
+                              'WHERE category.name = expense.category'))
+            conn.execute(text('ALTER TABLE expense ALTER COLUMN category_id SET NOT NULL'))
+            conn.execute(text('ALTER TABLE expense DROP COLUMN category'))
+        else:
+            # series_key is normalized by the next step
+            _rebuild_sqlite_table(conn, inspect(db.engine), table,
+                                  {'category_id': '(SELECT id FROM category WHERE name = old.category)',
+                                   'series_key': 'old.description'})
+
+def _backfill_series_keys(fresh):
+    """Fill in the recurring-series key of existing expenses, which is computed in Python"""
+    if fresh:
+        return
+    
+    postgres = db.engine.dialect.name == 'postgresql'
+    with db.engine.begin() as conn:
+        if postgres:
+            conn.execute(text('ALTER TABLE expense ADD COLUMN series_key VARCHAR(120)'))
+        keys = [{'row_id': row_id, 'key': normalize_description(description)}
+                for row_id, description in conn.execute(text('SELECT id, description FROM expense'))]
+        if keys:
+            conn.execute(text('UPDATE expense SET series_key = :key WHERE id = :row_id'), keys)
+        if postgres:
+            conn.execute(text('ALTER TABLE expense ALTER COLUMN series_key SET NOT NULL'))
+
+def _rebuild_sqlite_table(conn, inspector, table, values=None):
+    """
+    Recreate a SQLite table from its current model and copy the rows over,
+    `values` giving the SQL (over the old row, `old`) of changed columns
+    """
+    values = values or {}
+    # Renamed indexes keep their names, which the new table needs
+    old = f'{table.name}_old'
+    indexes = inspector.get_indexes(table.name)
+    conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {old}'))
+    for index in indexes:
+        conn.execute(text(f'DROP INDEX {index["name"]}'))
+    table.create(conn)
+    columns = [column.name for column in table.columns]
+    conn.execute(text(f'INSERT INTO {table.name} ({", ".join(columns)}) '
+                      f'SELECT {", ".join(values.get(name, f"old.{name}") for name in columns)} FROM {old} AS old'))
+    conn.execute(text(f'DROP TABLE {old}'))
+
+def _create_user_date_indexes(fresh):
+    """Add the (user, date), (user, category, date) and (user, series key) indexes to existing tables"""
+    for table in (Expense.__table__, Income.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def _backfill_rollups(fresh):
+    """Populate the monthly summaries and recurring-payment series from existing expenses"""
+    if fresh:
+        return
+    rebuild_monthly_summaries()
+    rebuild_recurring_series()
+    db.session.commit()
+
+def _create_search_index(fresh):
+    """Build the expense search index, which create_all doesn't know about (so also on fresh databases)"""
+    create_search_index()
+
+# Ordered list of (name, step), taking a database from the original schema
+# (users, expenses with Float amounts and category names, incomes, balances,
+# budgets) to the current models. Each step receives `fresh`, which is True
+# when the tables were just created from the current models and need no data
+# fixes. Tables that didn't exist before are created by create_all.
+MIGRATIONS = [
+    ('0001_user_columns', _add_user_columns),
+    ('0002_money_as_integer_cents', _convert_money_to_cents),
+    ('0003_category_dimension', _intern_categories),
+    ('0004_expense_series_keys', _backfill_series_keys),
+    ('0005_user_date_indexes', _create_user_date_indexes),
+    ('0006_rollup_backfill', _backfill_rollups),
+    ('0007_expense_search_index', _create_search_index),
+]
+
+def upgrade_database():
+    """Create missing tables and apply any pending migrations"""
+    fresh = not inspect(db.engine).has_table(Expense.__tablename__)
+    db.create_all()
+
+    applied = {row.name for row in SchemaMigration.query.all()}
+    for name, step in MIGRATIONS:
+        if name in applied:
+            continue
+        logger.info("Applying migration %s", name)
+        step(fresh)
+        db.session.add(SchemaMigration(name=name))
+        db.session.commit()
@@ -1,11 +1,16 @@
 from datetime import datetime
 from app import db
+from money import Money
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
+    # Bumped by every write to the user's data; drives ETags and cache keys
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Expenses dated before this have been moved to expense_archive
+    archived_before = db.Column(db.DateTime)
     
     # Relationships
     expenses = db.relationship('Expense', backref='user', lazy=True)
@@ -13,31 +18,127 @@ class User(db.Model):
     balance = db.relationship('Balance', backref='user', uselist=False, lazy=True)
     budget = db.relationship('Budget', backref='user', uselist=False, lazy=True)
 
+# Expense category names, interned so rows store and compare integer ids
+class Category(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+def normalize_description(description):
+    """Key used to group expenses into a recurring series"""
+    return ' '.join(description.lower().split())
+
+def _series_key(context):
+    return normalize_description(context.get_current_parameters()['description'])
+
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(120), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(50), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # The recurring series the expense belongs to, so removals recompute it by exact key
+    series_key = db.Column(db.String(120), nullable=False, default=_series_key)
+
+    # Every listing filters by user and date range, optionally by category.
+    # AUTOINCREMENT keeps SQLite from reusing the ids of archived expenses.
+    __table_args__ = (
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_user_category_date', 'user_id', 'category_id', 'date'),
+        db.Index('ix_expense_user_series_key', 'user_id', 'series_key'),
+        {'sqlite_autoincrement': True},
+    )
+
+class ExpenseArchive(db.Model):
+    """Expenses from closed months, moved out of the expense table by archive_expenses"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original expense id
+    description = db.Column(db.String(120), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    series_key = db.Column(db.String(120), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_expense_archive_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_archive_user_series_key', 'user_id', 'series_key'),
+    )
 
 class Income(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(120), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_income_user_date', 'user_id', 'date'),
+    )
+
 class Balance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, default=0.0)
+    amount = db.Column(Money, default=0)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Budget(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, default=0.0)
+    amount = db.Column(Money, default=0)
     month = db.Column(db.Integer, default=datetime.utcnow().month)
     year = db.Column(db.Integer, default=datetime.utcnow().year)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+class SchemaMigration(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Per-month, per-category expense totals, updated alongside every expense write
+class MonthlySummary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    total = db.Column(Money, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'category_id',
+                            name='uq_monthly_summary_user_month_category'),
+    )
+
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'csv' or 'excel'
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    processed_rows = db.Column(db.Integer, default=0)
+    imported_count = db.Column(db.Integer, default=0)
+    rejected_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(Money, default=0)
+    rejected = db.Column(db.Text)  # JSON list of {'row', 'error'}
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # last progress written by the running import
+
+# Running per-description expense stats used to detect recurring payments
+class RecurringSeries(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(120), nullable=False)  # normalized description
+    description = db.Column(db.String(120), nullable=False)  # most recent spelling
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(Money, nullable=False, default=0)
+    min_amount = db.Column(Money, nullable=False)
+    max_amount = db.Column(Money, nullable=False)
+    first_date = db.Column(db.DateTime, nullable=False)
+    last_date = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_recurring_series_user_key'),
+    )
@@ -0,0 +1,61 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.types import TypeDecorator, BigInteger
+
+CENT = Decimal('0.01')
+
+def parse_amount(value):
+    """
+    Convert an API or import value (str, int, float or Decimal) to a Decimal
+    rounded to whole cents. Raises ValueError for anything else.
+    """
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f'Invalid amount: {value!r}')
+    try:
+        # str() keeps floats like 0.1 from carrying their binary error along
+        amount = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+        if not amount.is_finite():
+            raise ValueError(f'Invalid amount: {value!r}')
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value!r}')
+
+def to_cents(amount):
+    """Integer cents for an amount"""
+    return int(parse_amount(amount).scaleb(2))
+
+def from_cents(cents):
+    """Decimal amount for integer cents"""
+    return (Decimal(int(round(cents))) / 100).quantize(CENT)
+
+class Money(TypeDecorator):
+    """A Decimal amount stored as integer cents, so SQL SUMs and updates are exact"""
+    impl = BigInteger
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_cents(value)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # Databases migrated from Float keep REAL affinity on SQLite, so accept floats
+        return from_cents(value)
+
+def json_default(value):
+    """Encode Decimal amounts as JSON numbers, which is what the front end expects"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+class MoneyJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with Decimal amounts encoded as numbers instead of strings"""
+    
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
@@ -0,0 +1,225 @@
+from datetime import timedelta
+from sqlalchemy import case, func, select, insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import RecurringSeries, normalize_description
+from archive import all_expenses
+from categories import category_names
+
+# Average gap between payments (in days) accepted for each frequency
+FREQUENCIES = [
+    ('Weekly', 5, 9, 7),
+    ('Biweekly', 12, 17, 14),
+    ('Monthly', 26, 35, 30),
+    ('Quarterly', 80, 100, 91),
+    ('Annual', 350, 380, 365),
+]
+
+# Stat columns in the argument order of _merge_stats
+SERIES_STATS = (
+    RecurringSeries.description, RecurringSeries.category_id, RecurringSeries.count,
+    RecurringSeries.total, RecurringSeries.min_amount, RecurringSeries.max_amount,
+    RecurringSeries.first_date, RecurringSeries.last_date,
+)
+
+# Keys per IN (...) lookup, well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def _merge_stats(groups, description, category_id, count, total, min_amount, max_amount,
+                 first_date, last_date):
+    """Fold one group of stats into `groups` under its normalized key"""
+    key = normalize_description(description)
+    stats = groups.get(key)
+    if stats is None:
+        groups[key] = {
+            'description': description, 'category_id': category_id, 'count': count, 'total': total,
+            'min_amount': min_amount, 'max_amount': max_amount,
+            'first_date': first_date, 'last_date': last_date
+        }
+        return
+    
+    if last_date >= stats['last_date']:
+        stats['description'] = description
+        stats['category_id'] = category_id
+        stats['last_date'] = last_date
+    stats['count'] += count
+    stats['total'] += total
+    stats['min_amount'] = min(stats['min_amount'], min_amount)
+    stats['max_amount'] = max(stats['max_amount'], max_amount)
+    stats['first_date'] = min(stats['first_date'], first_date)
+
+def series_added(user_id, rows):
+    """
+    Fold new (description, category_id, date, amount) rows into the user's series
+    in the current transaction
+    """
+    groups = {}
+    for description, category_id, date, amount in rows:
+        _merge_stats(groups, description, category_id, 1, amount, amount, amount, date, date)
+    
+    # One locked read per chunk of keys and two executemany writes, rather than
+    # an UPDATE (and maybe an INSERT) per key, which crawled on large imports
+    existing = {}
+    keys = list(groups)
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        query = select(RecurringSeries.id, *SERIES_STATS).where(
+            RecurringSeries.user_id == user_id,
+            RecurringSeries.key.in_(keys[start:start + LOOKUP_CHUNK_SIZE])
+        ).with_for_update()
+        for series_id, *stats in db.session.execute(query):
+            existing[normalize_description(stats[0])] = (series_id, stats)
+    
+    updates, inserts = [], []
+    for key, stats in groups.items():
+        if key not in existing:
+            inserts.append({'user_id': user_id, 'key': key, **stats})
+            continue
+        series_id, current = existing[key]
+        merged = {}
+        _merge_stats(merged, *current)
+        _merge_stats(merged, *(stats[column.key] for column in SERIES_STATS))
+        updates.append({'id': series_id, **merged[key]})
+    
+    if updates:
+        db.session.execute(update(RecurringSeries), updates)
+    if inserts:
+        _insert_series(inserts)
+
+def _insert_series(rows):
+    """
+    INSERT new series, merging into any that another transaction added after
+    the locked read (which can't lock rows that don't exist yet)
+    """
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    upsert = dialect.insert(RecurringSeries)
+    new = upsert.excluded
+    newer = new.last_date >= RecurringSeries.last_date
+    db.session.execute(
+        upsert.on_conflict_do_update(
+            index_elements=['user_id', 'key'],
+            set_={
+                'description': case((newer, new.description), else_=RecurringSeries.description),
+                'category_id': case((newer, new.category_id), else_=RecurringSeries.category_id),
+                'last_date': case((newer, new.last_date), else_=RecurringSeries.last_date),
+                'count': RecurringSeries.count + new.count,
+                'total': RecurringSeries.total + new.total,
+                'min_amount': case((new.min_amount < RecurringSeries.min_amount, new.min_amount),
+                                   else_=RecurringSeries.min_amount),
+                'max_amount': case((new.max_amount > RecurringSeries.max_amount, new.max_amount),
+                                   else_=RecurringSeries.max_amount),
+                'first_date': case((new.first_date < RecurringSeries.first_date, new.first_date),
+                                   else_=RecurringSeries.first_date),
+            }
+        ),
+        rows
+    )
+
+def series_removed(user_id, keys):
+    """
+    Recompute the user's series with the given keys (the series_key of
+    removed or recategorized expenses) in the current transaction, from the
+    expenses left in both tables. Other series are left alone.
+    """
+    keys = list(set(keys))
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        expenses = all_expenses(user_id, criteria=lambda model: model.series_key.in_(chunk))
+        query = select(
+            expenses.c.description, expenses.c.category_id,
+            func.count(expenses.c.id), func.sum(expenses.c.amount),
+            func.min(expenses.c.amount), func.max(expenses.c.amount),
+            func.min(expenses.c.date), func.max(expenses.c.date)
+        ).group_by(expenses.c.description, expenses.c.category_id)
+        
+        groups = {}
+        for stats in db.session.execute(query):
+            _merge_stats(groups, *stats)
+        
+        db.session.execute(delete(RecurringSeries).where(
+            RecurringSeries.user_id == user_id, RecurringSeries.key.in_(chunk)
+        ))
+        if groups:
+            _insert_series([{'user_id': user_id, 'key': key, **stats} for key, stats in groups.items()])
+
+def rebuild_recurring_series(user_id=None):
+    """
+    Recompute series from the expense and archive tables. SQL aggregates per
+    exact description; the (few) descriptions are then merged by normalized key.
+    """
+    expenses = all_expenses(user_id)
+    query = select(
+        expenses.c.user_id, expenses.c.description, expenses.c.category_id,
+        func.count(expenses.c.id), func.sum(expenses.c.amount),
+        func.min(expenses.c.amount), func.max(expenses.c.amount),
+        func.min(expenses.c.date), func.max(expenses.c.date)
+    ).group_by(expenses.c.user_id, expenses.c.description, expenses.c.category_id)
+    clear = delete(RecurringSeries)
+    
+    if user_id is not None:
+        clear = clear.where(RecurringSeries.user_id == user_id)
+    
+    groups_by_user = {}
+    for row_user_id, *stats in db.session.execute(query):
+        _merge_stats(groups_by_user.setdefault(row_user_id, {}), *stats)
+    
+    db.session.execute(clear)
+    rows = [
+        {'user_id': row_user_id, 'key': key, **stats}
+        for row_user_id, groups in groups_by_user.items()
+        for key, stats in groups.items()
+    ]
+    if rows:
+        db.session.execute(insert(RecurringSeries), rows)
+
+def infer_frequency(first_date, last_date, count):
+    """Name the frequency matching the average gap between payments, or None"""
+    if count < 2:
+        return None, None
+    
+    average_gap = (last_date - first_date).total_seconds() / 86400 / (count - 1)
+    for name, low, high, days in FREQUENCIES:
+        if low <= average_gap <= high:
+            return name, days
+    return None, None
+
+def detect_recurring_expenses(user_id, threshold=0.9):
+    """
+    Detect recurring expenses from the user's series: at least two payments
+    in different months, amounts within `threshold` of the average, and a
+    regular average gap. Reads O(series) rows regardless of history size.
+    """
+    candidates = db.session.scalars(
+        select(RecurringSeries)
+        .where(RecurringSeries.user_id == user_id, RecurringSeries.count >= 2)
+        .order_by(RecurringSeries.description)
+    ).all()
+    names = category_names(series.category_id for series in candidates)
+    
+    recurring = []
+    for series in candidates:
+        first, last = series.first_date, series.last_date
+        if (first.year, first.month) == (last.year, last.month):
+            continue
+        
+        avg_amount = series.total / series.count
+        if avg_amount <= 0:
+            continue
+        spread = max(avg_amount - series.min_amount, series.max_amount - avg_amount)
+        if spread / avg_amount > threshold:
+            continue
+        
+        frequency, period_days = infer_frequency(first, last, series.count)
+        if frequency is None:
+            continue
+        
+        recurring.append({
+            'description': series.description,
+            'category': names[series.category_id],
+            'amount': avg_amount,
+            'frequency': frequency,
+            'count': series.count,
+            'lastDate': last.strftime('%Y-%m-%d'),
+            'nextDate': (last + timedelta(days=period_days)).strftime('%Y-%m-%d')
+        })
+    
+    return recurring
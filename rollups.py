@@ -0,0 +1,107 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, extract, insert, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import MonthlySummary
+from recurring import series_added, series_removed
+from archive import all_expenses
+
+def expense_deltas(expenses, sign=1):
+    """Group expenses into {(year, month, category_id): [total, count]} deltas"""
+    return row_deltas(((e.category_id, e.date, e.amount) for e in expenses), sign)
+
+def row_deltas(rows, sign=1, deltas=None):
+    """Same as expense_deltas for (category_id, date, amount) tuples, optionally accumulating"""
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0])
+    for category_id, date, amount in rows:
+        delta = deltas[(date.year, date.month, category_id)]
+        delta[0] += sign * amount
+        delta[1] += sign
+    return deltas
+
+def apply_summary_deltas(user_id, deltas):
+    """
+    Add deltas to the user's monthly summaries in the current transaction.
+    Callers commit together with the expense changes that produced them.
+    """
+    if not deltas:
+        return
+    
+    # One upsert rather than UPDATE-then-INSERT, which let two transactions
+    # adding the first expense of a month both INSERT the same summary
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    upsert = dialect.insert(MonthlySummary)
+    db.session.execute(
+        upsert.on_conflict_do_update(
+            index_elements=['user_id', 'year', 'month', 'category_id'],
+            set_={'total': MonthlySummary.total + upsert.excluded.total,
+                  'count': MonthlySummary.count + upsert.excluded.count}
+        ),
+        [{'user_id': user_id, 'year': year, 'month': month, 'category_id': category_id,
+          'total': total, 'count': count}
+         for (year, month, category_id), (total, count) in deltas.items()]
+    )
+    
+    # Drop buckets whose last expense was removed
+    if any(count <= 0 for total, count in deltas.values()):
+        db.session.execute(delete(MonthlySummary).where(
+            MonthlySummary.user_id == user_id,
+            MonthlySummary.count <= 0
+        ))
+
+def expenses_added(user_id, expenses):
+    """Record newly created expenses in the monthly summaries and recurring series"""
+    apply_summary_deltas(user_id, expense_deltas(expenses))
+    series_added(user_id, ((e.description, e.category_id, e.date, e.amount) for e in expenses))
+
+def expenses_removed(user_id, expenses):
+    """Remove deleted expenses from the monthly summaries and recurring series"""
+    apply_summary_deltas(user_id, expense_deltas(expenses, sign=-1))
+    series_removed(user_id, (e.series_key for e in expenses))
+
+def _grouped_expenses(expenses):
+    """SELECT of totals and counts per user, year, month and category from an all_expenses subquery"""
+    year_col = extract('year', expenses.c.date)
+    month_col = extract('month', expenses.c.date)
+    return select(
+        expenses.c.user_id, year_col, month_col, expenses.c.category_id,
+        func.sum(expenses.c.amount), func.count(expenses.c.id)
+    ).group_by(expenses.c.user_id, year_col, month_col, expenses.c.category_id)
+
+SUMMARY_COLUMNS = ['user_id', 'year', 'month', 'category_id', 'total', 'count']
+
+def rebuild_monthly_summaries(user_id=None):
+    """
+    Recompute the summaries from the expense and archive tables (all users by
+    default) in the current transaction
+    """
+    grouped = _grouped_expenses(all_expenses(user_id))
+    clear = delete(MonthlySummary)
+    
+    if user_id is not None:
+        clear = clear.where(MonthlySummary.user_id == user_id)
+    
+    db.session.execute(clear)
+    db.session.execute(insert(MonthlySummary).from_select(SUMMARY_COLUMNS, grouped))
+
+def refresh_monthly_summaries(user_id, first_date, last_date):
+    """
+    Recompute one user's summaries for the months from `first_date` through
+    `last_date` in the current transaction. Used after set-based changes whose
+    old values aren't known, such as a bulk recategorize.
+    """
+    start = datetime(first_date.year, first_date.month, 1)
+    end = datetime(last_date.year + last_date.month // 12, last_date.month % 12 + 1, 1)
+    month_index = MonthlySummary.year * 12 + MonthlySummary.month
+    
+    db.session.execute(delete(MonthlySummary).where(
+        MonthlySummary.user_id == user_id,
+        month_index.between(first_date.year * 12 + first_date.month,
+                            last_date.year * 12 + last_date.month)
+    ))
+    db.session.execute(insert(MonthlySummary).from_select(
+        SUMMARY_COLUMNS,
+        _grouped_expenses(all_expenses(user_id, start, end))
+    ))
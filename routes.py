@@ -1,17 +1,39 @@
 import json
 import csv
 import io
+import tempfile
 from datetime import datetime
-from flask import render_template, request, jsonify, redirect, url_for, session, flash, Response
+from flask import render_template, request, jsonify, redirect, url_for, session, flash, Response, stream_with_context
+from sqlalchemy import select
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
-from openpyxl import load_workbook
 from app import db
-from models import User, Expense, Income, Balance, Budget
-from utils import get_current_user, get_monthly_expenses, calculate_budget_progress
+from models import User, Expense, ExpenseArchive, Income, Balance, Budget, MonthlySummary, ImportJob, Category
+from categories import category_id, category_names
+from money import parse_amount
+from rollups import expenses_added, expenses_removed
+from recurring import detect_recurring_expenses
+from importer import import_expenses, read_csv_rows, read_excel_rows, ImportTooLarge
+from jobs import submit_import_job, job_to_dict, fail_stale_job
+from search import search_expenses
+from batch import add_expenses, add_incomes, delete_expenses, recategorize_expenses, BatchError
+from cache import user_data_cache, cache_stats
+from instrumentation import query_budget
+from serializers import (INCOME_COLUMNS, EXPENSE_FIELDS, INCOME_FIELDS, export_columns,
+                         serialize_rows, encode_json, json_response)
+from utils import (get_current_user, get_month_range, get_budget_progress, get_monthly_trend_data,
+                   parse_date_range, select_expenses, gzip_stream, get_expenses_page, count_expenses,
+                   mark_data_changed, adjust_balance, conditional_on_user_data)
 
 def register_routes(app):
     
+    @app.errorhandler(413)
+    def upload_too_large(error):
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'success': False, 'error': f'File is larger than {limit_mb} MB'}), 413
+    
     @app.route('/')
     def index():
         # For now, use a default user (in a real app, this would use authentication)
@@ -23,8 +45,8 @@ def register_routes(app):
             db.session.add(default_user)
             
             # Create initial balance and budget
-            default_balance = Balance(amount=0.0, user=default_user)
-            default_budget = Budget(amount=0.0, user=default_user)
+            default_balance = Balance(amount=0, user=default_user)
+            default_budget = Budget(amount=0, user=default_user)
             
             db.session.add(default_balance)
             db.session.add(default_budget)
@@ -36,12 +58,28 @@ def register_routes(app):
         return render_template('index.html')
     
     @app.route('/api/user-data', methods=['GET'])
+    @conditional_on_user_data
     def get_user_data():
         """Get all user data including balance, budget, and expenses"""
         user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
             
+        # Serve the encoded dashboard payload from cache; the key changes with every write
+        current_month = datetime.now().month
+        current_year = datetime.now().year
+        layout = request.args.get('layout', 'records')
+        cache_key = (user.id, user.data_version, current_year, current_month, layout)
+        
+        body = user_data_cache.get(cache_key)
+        if body is None:
+            body = encode_json(build_user_data(user, current_month, current_year, layout))
+            user_data_cache.set(cache_key, body)
+        
+        return json_response(body)
+    
+    def build_user_data(user, current_month, current_year, layout='records'):
+        """Build the /api/user-data payload for a month"""
         # Get user's balance
         balance = user.balance
         balance_amount = balance.amount if balance else 0
@@ -50,43 +88,25 @@ def register_routes(app):
         budget = user.budget
         budget_amount = budget.amount if budget else 0
         
-        # Get user's expenses for the current month
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        expenses = get_monthly_expenses(user.id, current_month, current_year)
+        # Get user's expenses for the current month as plain column tuples
+        start_date, end_date = get_month_range(current_month, current_year)
+        expenses = db.session.execute(select_expenses(user.id, start_date=start_date, end_date=end_date)).all()
         
         # Calculate budget progress
-        budget_progress = calculate_budget_progress(budget_amount, expenses)
+        budget_progress = get_budget_progress(user, current_month, current_year)
         
-        # Format expenses for JSON response
-        expenses_list = []
-        for expense in expenses:
-            expenses_list.append({
-                'id': expense.id,
-                'description': expense.description,
-                'amount': expense.amount,
-                'category': expense.category,
-                'date': expense.date.strftime('%Y-%m-%d')
-            })
-            
         # Get user's income transactions
-        incomes = Income.query.filter_by(user_id=user.id).order_by(Income.date.desc()).all()
-        incomes_list = []
-        for income in incomes:
-            incomes_list.append({
-                'id': income.id,
-                'description': income.description,
-                'amount': income.amount,
-                'date': income.date.strftime('%Y-%m-%d')
-            })
+        incomes = db.session.execute(
+            select(*INCOME_COLUMNS).where(Income.user_id == user.id).order_by(Income.date.desc())
+        ).all()
         
-        return jsonify({
+        return {
             'balance': balance_amount,
             'budget': budget_amount,
             'budgetProgress': budget_progress,
-            'expenses': expenses_list,
-            'incomes': incomes_list
-        })
+            'expenses': serialize_rows(expenses, EXPENSE_FIELDS, layout),
+            'incomes': serialize_rows(incomes, INCOME_FIELDS, layout)
+        }
     
     @app.route('/api/balance', methods=['PUT'])
     def update_balance():
@@ -101,15 +121,21 @@ def register_routes(app):
         if new_balance is None:
             return jsonify({'error': 'Balance not provided'}), 400
             
+        try:
+            new_balance = parse_amount(new_balance)
+        except ValueError:
+            return jsonify({'error': 'Invalid balance'}), 400
+            
         # Update user's balance
         balance = user.balance
         if not balance:
-            balance = Balance(amount=float(new_balance), user=user)
+            balance = Balance(amount=new_balance, user=user)
             db.session.add(balance)
         else:
-            balance.amount = float(new_balance)
+            balance.amount = new_balance
             balance.last_updated = datetime.utcnow()
             
+        mark_data_changed(user.id)
         db.session.commit()
         
         return jsonify({'balance': balance.amount})
@@ -127,25 +153,30 @@ def register_routes(app):
         if new_budget is None:
             return jsonify({'error': 'Budget not provided'}), 400
             
+        try:
+            new_budget = parse_amount(new_budget)
+        except ValueError:
+            return jsonify({'error': 'Invalid budget'}), 400
+            
         # Update user's budget
         budget = user.budget
         if not budget:
             budget = Budget(
-                amount=float(new_budget),
+                amount=new_budget,
                 month=datetime.utcnow().month,
                 year=datetime.utcnow().year,
                 user=user
             )
             db.session.add(budget)
         else:
-            budget.amount = float(new_budget)
+            budget.amount = new_budget
             budget.last_updated = datetime.utcnow()
             
+        mark_data_changed(user.id)
         db.session.commit()
         
         # Get updated budget progress
-        expenses = get_monthly_expenses(user.id, datetime.now().month, datetime.now().year)
-        budget_progress = calculate_budget_progress(budget.amount, expenses)
+        budget_progress = get_budget_progress(user)
         
         return jsonify({
             'budget': budget.amount,
@@ -153,6 +184,7 @@ def register_routes(app):
         })
     
     @app.route('/api/expenses', methods=['GET', 'POST'])
+    @conditional_on_user_data
     def handle_expenses():
         user = get_current_user()
         if not user:
@@ -168,6 +200,11 @@ def register_routes(app):
             if not all([amount, category]):
                 return jsonify({'error': 'Missing required fields'}), 400
                 
+            try:
+                amount = parse_amount(amount)
+            except ValueError:
+                return jsonify({'error': 'Invalid amount'}), 400
+                
             # Parse date if provided, otherwise use current date
             if date_str:
                 try:
@@ -180,62 +217,186 @@ def register_routes(app):
             # Create new expense
             expense = Expense(
                 description=category,  # Use category as description
-                amount=float(amount),
-                category=category,
+                amount=amount,
+                category_id=category_id(category),
                 date=date,
                 user=user
             )
             
-            # Update balance
-            balance = user.balance
-            if balance:
-                balance.amount -= float(amount)
-                
             db.session.add(expense)
+            balance_amount = adjust_balance(user, -amount)
+            expenses_added(user.id, [expense])
+            mark_data_changed(user.id)
             db.session.commit()
             
             # Get updated budget progress
-            budget = user.budget
-            budget_amount = budget.amount if budget else 0
-            expenses = get_monthly_expenses(user.id, date.month, date.year)
-            budget_progress = calculate_budget_progress(budget_amount, expenses)
+            budget_progress = get_budget_progress(user, date.month, date.year)
             
             return jsonify({
                 'id': expense.id,
                 'description': expense.description,
                 'amount': expense.amount,
-                'category': expense.category,
+                'category': category,
                 'date': expense.date.strftime('%Y-%m-%d'),
-                'balance': balance.amount if balance else 0,
+                'balance': balance_amount if balance_amount is not None else 0,
                 'budgetProgress': budget_progress
             })
         else:
+            # ?limit=N[&cursor=...] returns one keyset-paginated page
+            if 'limit' in request.args or 'cursor' in request.args:
+                return list_expenses_page(user)
+                
             # Get all expenses or filter by month and year
             month = request.args.get('month')
             year = request.args.get('year')
             category = request.args.get('category')
             
+            start_date = end_date = None
             if month and year:
-                month = int(month)
-                year = int(year)
-                expenses = get_monthly_expenses(user.id, month, year, category)
-            elif category:
-                expenses = Expense.query.filter_by(user_id=user.id, category=category).order_by(Expense.date.desc()).all()
-            else:
-                expenses = Expense.query.filter_by(user_id=user.id).order_by(Expense.date.desc()).all()
-                
-            # Format expenses for JSON response
-            expenses_list = []
-            for expense in expenses:
-                expenses_list.append({
-                    'id': expense.id,
-                    'description': expense.description,
-                    'amount': expense.amount,
-                    'category': expense.category,
-                    'date': expense.date.strftime('%Y-%m-%d')
-                })
-                
-            return jsonify(expenses_list)
+                start_date, end_date = get_month_range(int(month), int(year))
+            
+            expenses = db.session.execute(select_expenses(user.id, start_date=start_date, end_date=end_date,
+                                                          category=category)).all()
+            
+            return json_response(serialize_rows(expenses, EXPENSE_FIELDS, request.args.get('layout', 'records')))
+    
+    def list_expenses_page(user):
+        """One page of expenses with optional start/end/category filters and total count"""
+        limit = request.args.get('limit', app.config['EXPENSES_PAGE_SIZE'], type=int)
+        if limit < 1 or limit > app.config['EXPENSES_MAX_PAGE_SIZE']:
+            return jsonify({'error': f"limit must be between 1 and {app.config['EXPENSES_MAX_PAGE_SIZE']}"}), 400
+            
+        try:
+            start_date, end_date = parse_date_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        category = request.args.get('category')
+            
+        try:
+            expenses, next_cursor = get_expenses_page(
+                user.id, limit, request.args.get('cursor'), start_date, end_date, category
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+            
+        page = {
+            'expenses': serialize_rows(expenses, EXPENSE_FIELDS, request.args.get('layout', 'records')),
+            'nextCursor': next_cursor
+        }
+        
+        if request.args.get('includeTotal') == '1':
+            page['total'] = count_expenses(user.id, start_date, end_date, category)
+        
+        return json_response(page)
+    
+    @app.route('/api/expenses/search', methods=['GET'])
+    @conditional_on_user_data
+    def search_expenses_page():
+        """
+        Expenses whose description or category contains every word of `q` as a
+        prefix, with optional start/end/category/min/max filters, one keyset page at a time
+        """
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        limit = request.args.get('limit', app.config['EXPENSES_PAGE_SIZE'], type=int)
+        if limit < 1 or limit > app.config['EXPENSES_MAX_PAGE_SIZE']:
+            return jsonify({'error': f"limit must be between 1 and {app.config['EXPENSES_MAX_PAGE_SIZE']}"}), 400
+        
+        try:
+            start_date, end_date = parse_date_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        try:
+            min_amount = parse_amount(request.args['min']) if request.args.get('min') else None
+            max_amount = parse_amount(request.args['max']) if request.args.get('max') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            expenses, next_cursor = search_expenses(
+                user.id, request.args.get('q'), limit, request.args.get('cursor'), start_date, end_date,
+                request.args.get('category'), min_amount, max_amount
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return json_response({
+            'expenses': serialize_rows(expenses, EXPENSE_FIELDS, request.args.get('layout', 'records')),
+            'nextCursor': next_cursor
+        })
+    
+    def batch_response(user, add_items):
+        """
+        Run a batch insert on the request's items (a JSON array, or an object
+        with an "items" array) and build the shared reply
+        """
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+        try:
+            results, balance = add_items(user, items, app.config['BATCH_MAX_ITEMS'])
+        except BatchError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        created = sum(1 for result in results if 'id' in result)
+        return jsonify({
+            'results': results,
+            'createdCount': created,
+            'rejectedCount': len(results) - created,
+            'balance': balance if balance is not None else 0,
+            'budgetProgress': get_budget_progress(user)
+        })
+    
+    @app.route('/api/expenses/batch', methods=['POST'])
+    def add_expenses_batch():
+        """Add many expenses in one transaction, with a result (id or error) per item"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        return batch_response(user, add_expenses)
+    
+    @app.route('/api/expenses/bulk-delete', methods=['POST'])
+    def bulk_delete_expenses():
+        """Delete the expenses selected by ids and/or a start/end/category filter in one statement"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        data = request.get_json(silent=True)
+        try:
+            deleted_count, balance = delete_expenses(
+                user, data, bool(data.get('returnToBalance')) if isinstance(data, dict) else False,
+                app.config['BULK_MAX_IDS']
+            )
+        except BatchError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'deletedCount': deleted_count,
+            'balance': balance if balance is not None else 0,
+            'budgetProgress': get_budget_progress(user)
+        })
+    
+    @app.route('/api/expenses/bulk-recategorize', methods=['POST'])
+    def bulk_recategorize_expenses():
+        """Move the expenses selected by ids and/or a filter to `newCategory` in one statement"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        data = request.get_json(silent=True)
+        try:
+            updated_count = recategorize_expenses(
+                user, data, data.get('newCategory') if isinstance(data, dict) else None,
+                app.config['BULK_MAX_IDS']
+            )
+        except BatchError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'success': True, 'updatedCount': updated_count})
     
     @app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
     def delete_expense(expense_id):
@@ -244,6 +405,9 @@ def register_routes(app):
             return jsonify({'error': 'User not found'}), 404
             
         expense = Expense.query.filter_by(id=expense_id, user_id=user.id).first()
+        if not expense:
+            # It may be in an archived month
+            expense = ExpenseArchive.query.filter_by(id=expense_id, user_id=user.id).first()
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
             
@@ -253,9 +417,7 @@ def register_routes(app):
         
         if return_to_balance:
             # Add amount back to balance
-            balance = user.balance
-            if balance:
-                balance.amount += expense.amount
+            adjust_balance(user, expense.amount)
         
         # Calculate current date's month and year
         current_month = datetime.now().month
@@ -265,17 +427,17 @@ def register_routes(app):
         expense_month = expense.date.month
         expense_year = expense.date.year
         
-        # Delete the expense
+        # Delete the expense and take it out of the monthly summaries; the
+        # series are recomputed from what is left, so the DELETE goes first
         db.session.delete(expense)
+        expenses_removed(user.id, [expense])
+        mark_data_changed(user.id)
         db.session.commit()
         
         # Get updated budget progress if expense was in the current month
         budget_progress = 0
         if expense_month == current_month and expense_year == current_year:
-            budget = user.budget
-            budget_amount = budget.amount if budget else 0
-            expenses = get_monthly_expenses(user.id, current_month, current_year)
-            budget_progress = calculate_budget_progress(budget_amount, expenses)
+            budget_progress = get_budget_progress(user, current_month, current_year)
         
         return jsonify({
             'success': True,
@@ -283,6 +445,43 @@ def register_routes(app):
             'budgetProgress': budget_progress
         })
     
+    @app.route('/api/cache-stats', methods=['GET'])
+    def get_cache_stats():
+        """Cache hit/miss counters for this worker process"""
+        return jsonify(cache_stats())
+    
+    @app.route('/api/trends', methods=['GET'])
+    @conditional_on_user_data
+    def get_trends():
+        """Get monthly expense totals for the trend chart"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        months = request.args.get('months', 12, type=int)
+        if months < 1 or months > 60:
+            return jsonify({'error': 'months must be between 1 and 60'}), 400
+            
+        return jsonify(get_monthly_trend_data(user.id, months))
+    
+    @app.route('/api/recurring', methods=['GET'])
+    @conditional_on_user_data
+    def get_recurring():
+        """Get the user's recurring expenses with their inferred frequency"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        return jsonify(detect_recurring_expenses(user.id))
+    
+    @app.route('/api/income/batch', methods=['POST'])
+    def add_incomes_batch():
+        """Add many incomes in one transaction, with a result (id or error) per item"""
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        return batch_response(user, add_incomes)
+    
     @app.route('/api/income', methods=['POST'])
     def add_income():
         user = get_current_user()
@@ -296,22 +495,27 @@ def register_routes(app):
         if not amount:
             return jsonify({'error': 'Amount is required'}), 400
             
+        try:
+            amount = parse_amount(amount)
+        except ValueError:
+            return jsonify({'error': 'Invalid amount'}), 400
+            
         # Create new income record
         income = Income(
             description=description or "Income",
-            amount=float(amount),
+            amount=amount,
             user=user
         )
         
-        # Update balance
-        balance = user.balance
-        if not balance:
-            balance = Balance(amount=float(amount), user=user)
-            db.session.add(balance)
-        else:
-            balance.amount += float(amount)
-            
         db.session.add(income)
+        
+        # Update balance, starting one at the income amount if the user has none
+        balance_amount = adjust_balance(user, amount)
+        if balance_amount is None:
+            db.session.add(Balance(amount=amount, user=user))
+            balance_amount = amount
+            
+        mark_data_changed(user.id)
         db.session.commit()
         
         # Format income data for response
@@ -324,96 +528,163 @@ def register_routes(app):
         
         return jsonify({
             'income': income_data,
-            'balance': balance.amount
+            'balance': balance_amount
         })
     
     @app.route('/api/export/csv', methods=['GET'])
+    @query_budget(None)  # a few statements per batch of rows
+    @conditional_on_user_data
     def export_csv():
         user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
             
-        # Get all expenses
-        expenses = Expense.query.filter_by(user_id=user.id).order_by(Expense.date.desc()).all()
+        # Optional filters: ?start=YYYY-MM-DD&end=YYYY-MM-DD&category=Food
+        try:
+            start_date, end_date = parse_date_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        category = request.args.get('category')
+        
+        # Select plain columns and stream them in batches (server-side cursor on Postgres)
+        query = select_expenses(
+            user.id, export_columns, start_date, end_date, category
+        ).execution_options(
+            yield_per=app.config['EXPORT_BATCH_SIZE']
+        )
         
-        # Create a CSV string
-        output = io.StringIO()
-        writer = csv.writer(output)
+        def generate_csv():
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(['ID', 'Description', 'Amount', 'Category', 'Date'])
+            
+            for rows in db.session.execute(query).partitions():
+                names = category_names(row.category for row in rows)
+                writer.writerows(
+                    (expense_id, description, amount, names[category], date.strftime('%Y-%m-%d'))
+                    for expense_id, description, amount, category, date in rows
+                )
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+            
+            yield output.getvalue()
         
-        # Write header
-        writer.writerow(['ID', 'Description', 'Amount', 'Category', 'Date'])
+        headers = {'Content-Disposition': 'attachment; filename=expenses.csv', 'Vary': 'Accept-Encoding'}
+        chunks = generate_csv()
         
-        # Write expense data
-        for expense in expenses:
-            writer.writerow([
-                expense.id,
-                expense.description,
-                expense.amount,
-                expense.category,
-                expense.date.strftime('%Y-%m-%d')
-            ])
-            
-        # Create response
-        response = Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': 'attachment; filename=expenses.csv'
-            }
-        )
+        # Compress on the fly when the client accepts it
+        if app.config['EXPORT_GZIP'] and 'gzip' in request.accept_encodings:
+            chunks = gzip_stream(chunks)
+            headers['Content-Encoding'] = 'gzip'
         
-        return response
+        return Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
     
     @app.route('/api/export/excel', methods=['GET'])
+    @query_budget(None)  # a few statements per batch of rows
+    @conditional_on_user_data
     def export_excel():
         user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
             
-        # Get all expenses
-        expenses = Expense.query.filter_by(user_id=user.id).order_by(Expense.date.desc()).all()
+        try:
+            start_date, end_date = parse_date_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        category = request.args.get('category')
         
-        # Create a workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Expenses"
+        # ?layout=full adds Incomes and Monthly Summary sheets
+        full_layout = request.args.get('layout') == 'full'
+        batch_size = app.config['EXPORT_BATCH_SIZE']
         
-        # Add header row with styling
-        headers = ['ID', 'Description', 'Amount', 'Category', 'Date']
-        for col_num, header in enumerate(headers, 1):
-            col_letter = get_column_letter(col_num)
-            ws[f'{col_letter}1'] = header
+        # Write-only workbooks append rows straight to disk instead of keeping cells in memory
+        wb = Workbook(write_only=True)
+        
+        def add_sheet(title, headers, rows):
+            ws = wb.create_sheet(title)
+            for col_num in range(1, len(headers) + 1):
+                ws.column_dimensions[get_column_letter(col_num)].width = 15
+            
             # Make headers bold
-            ws[f'{col_letter}1'].font = ws[f'{col_letter}1'].font.copy(bold=True)
-        
-        # Add expense data
-        for row_num, expense in enumerate(expenses, 2):
-            ws[f'A{row_num}'] = expense.id
-            ws[f'B{row_num}'] = expense.description
-            ws[f'C{row_num}'] = expense.amount
-            ws[f'D{row_num}'] = expense.category
-            ws[f'E{row_num}'] = expense.date.strftime('%Y-%m-%d')
-        
-        # Set column widths
-        for col_num, header in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            ws.column_dimensions[column_letter].width = 15
-        
-        # Save to memory
-        output = io.BytesIO()
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(ws, value=header)
+                cell.font = Font(bold=True)
+                header_cells.append(cell)
+            ws.append(header_cells)
+            
+            for row in rows:
+                ws.append(tuple(row))
+        
+        def stream_rows(query, date_index, category_index=None):
+            for rows in db.session.execute(query.execution_options(yield_per=batch_size)).partitions():
+                if category_index is not None:
+                    names = category_names(row[category_index] for row in rows)
+                for row in rows:
+                    row = list(row)
+                    row[date_index] = row[date_index].strftime('%Y-%m-%d')
+                    if category_index is not None:
+                        row[category_index] = names[row[category_index]]
+                    yield row
+        
+        expenses_query = select_expenses(user.id, export_columns, start_date, end_date, category)
+        add_sheet("Expenses", ['ID', 'Description', 'Amount', 'Category', 'Date'],
+                  stream_rows(expenses_query, 4, 3))
+        
+        if full_layout:
+            incomes_query = select(Income.id, Income.description, Income.amount, Income.date).where(
+                Income.user_id == user.id
+            ).order_by(Income.date.desc(), Income.id.desc())
+            add_sheet("Incomes", ['ID', 'Description', 'Amount', 'Date'], stream_rows(incomes_query, 3))
+            
+            summary_rows = db.session.execute(
+                select(MonthlySummary.year, MonthlySummary.month, Category.name,
+                       MonthlySummary.total, MonthlySummary.count)
+                .join(Category, Category.id == MonthlySummary.category_id)
+                .where(MonthlySummary.user_id == user.id)
+                .order_by(MonthlySummary.year.desc(), MonthlySummary.month.desc(), Category.name)
+            )
+            add_sheet("Monthly Summary", ['Year', 'Month', 'Category', 'Total', 'Count'], summary_rows)
+        
+        # Small files stay in memory, large ones spill over to a temp file
+        output = tempfile.SpooledTemporaryFile(max_size=app.config['EXPORT_SPOOL_MAX_BYTES'])
         wb.save(output)
+        size = output.tell()
         output.seek(0)
         
+        def read_chunks():
+            try:
+                while True:
+                    chunk = output.read(64 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                output.close()
+        
         # Create response
         return Response(
-            output.getvalue(),
+            read_chunks(),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             headers={
-                'Content-Disposition': 'attachment; filename=expenses.xlsx'
+                'Content-Disposition': 'attachment; filename=expenses.xlsx',
+                'Content-Length': str(size)
             }
         )
     
+    def import_response(result, user):
+        """Build the JSON reply shared by the synchronous import endpoints"""
+        balance = user.balance
+        return jsonify({
+            'success': True,
+            **result,
+            'balance': balance.amount if balance else 0,
+            'budgetProgress': get_budget_progress(user)
+        })
+    
     @app.route('/api/import/csv', methods=['POST'])
+    @query_budget(None)  # a few statements per batch of rows
     def import_csv():
         user = get_current_user()
         if not user:
@@ -429,73 +700,23 @@ def register_routes(app):
         if not file.filename.endswith('.csv'):
             return jsonify({'error': 'File must be a CSV'}), 400
             
-        # Read CSV file
-        stream = io.StringIO(file.stream.read().decode('utf-8'), newline=None)
-        csv_data = csv.reader(stream)
-        
-        # Skip header row
-        next(csv_data, None)
-        
-        # Process each row
-        imported_count = 0
-        total_amount = 0
-        
-        for row in csv_data:
-            if len(row) >= 4:  # Ensure we have enough columns
-                try:
-                    # Extract data
-                    description = row[1]
-                    amount = float(row[2])
-                    category = row[3]
-                    date_str = row[4] if len(row) > 4 else None
-                    
-                    # Parse date if available
-                    if date_str:
-                        try:
-                            date = datetime.strptime(date_str, '%Y-%m-%d')
-                        except ValueError:
-                            date = datetime.utcnow()
-                    else:
-                        date = datetime.utcnow()
-                        
-                    # Create new expense
-                    expense = Expense(
-                        description=description,
-                        amount=amount,
-                        category=category,
-                        date=date,
-                        user=user
-                    )
-                    
-                    db.session.add(expense)
-                    imported_count += 1
-                    total_amount += amount
-                    
-                except Exception as e:
-                    continue  # Skip invalid rows
-        
-        # Update balance
-        balance = user.balance
-        if balance:
-            balance.amount -= total_amount
+        # ?async=1 queues the import and returns a job id to poll
+        if request.args.get('async') == '1':
+            job = submit_import_job(user, 'csv', file)
+            return jsonify({'success': True, 'jobId': job.id, 'status': job.status}), 202
             
-        db.session.commit()
-        
-        # Get updated budget progress
-        budget = user.budget
-        budget_amount = budget.amount if budget else 0
-        expenses = get_monthly_expenses(user.id, datetime.now().month, datetime.now().year)
-        budget_progress = calculate_budget_progress(budget_amount, expenses)
-        
-        return jsonify({
-            'success': True,
-            'importedCount': imported_count,
-            'totalAmount': total_amount,
-            'balance': balance.amount if balance else 0,
-            'budgetProgress': budget_progress
-        })
+        try:
+            result = import_expenses(user, read_csv_rows(file.stream),
+                                     batch_size=app.config['IMPORT_BATCH_SIZE'],
+                                     max_rows=app.config['IMPORT_MAX_ROWS'])
+        except (UnicodeDecodeError, csv.Error, ImportTooLarge) as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': f'Error processing CSV file: {str(e)}'}), 400
+        
+        return import_response(result, user)
     
     @app.route('/api/import/excel', methods=['POST'])
+    @query_budget(None)  # a few statements per batch of rows
     def import_excel():
         user = get_current_user()
         if not user:
@@ -511,79 +732,43 @@ def register_routes(app):
         if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
             return jsonify({'error': 'File must be an Excel file (.xlsx or .xls)'}), 400
             
-        # Read Excel file
-        try:
-            # Load the workbook
-            wb = load_workbook(filename=io.BytesIO(file.read()))
-            ws = wb.active
-            
-            # Process each row
-            imported_count = 0
-            total_amount = 0
-            
-            # Iterate through rows, skipping the header (first row)
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if len(row) >= 4:  # Ensure we have enough columns
-                    try:
-                        # Extract data (row[0] is ID, which we ignore when importing)
-                        description = row[1] 
-                        amount = float(row[2]) if row[2] is not None else 0.0
-                        category = row[3]
-                        date_str = row[4] if len(row) > 4 and row[4] else None
-                        
-                        # Parse date if available
-                        if date_str:
-                            try:
-                                # Try to parse date (could be string or datetime object)
-                                if isinstance(date_str, datetime):
-                                    date = date_str
-                                else:
-                                    date = datetime.strptime(str(date_str), '%Y-%m-%d')
-                            except ValueError:
-                                date = datetime.utcnow()
-                        else:
-                            date = datetime.utcnow()
-                            
-                        # Create new expense
-                        expense = Expense(
-                            description=description,
-                            amount=amount,
-                            category=category,
-                            date=date,
-                            user=user
-                        )
-                        
-                        db.session.add(expense)
-                        imported_count += 1
-                        total_amount += amount
-                        
-                    except Exception as e:
-                        print(f"Error processing row: {e}")
-                        continue  # Skip invalid rows
-            
-            # Update balance
-            balance = user.balance
-            if balance:
-                balance.amount -= total_amount
-                
-            db.session.commit()
-            
-            # Get updated budget progress
-            budget = user.budget
-            budget_amount = budget.amount if budget else 0
-            expenses = get_monthly_expenses(user.id, datetime.now().month, datetime.now().year)
-            budget_progress = calculate_budget_progress(budget_amount, expenses)
-            
-            return jsonify({
-                'success': True,
-                'importedCount': imported_count,
-                'totalAmount': total_amount,
-                'balance': balance.amount if balance else 0,
-                'budgetProgress': budget_progress
-            })
+        if request.args.get('async') == '1':
+            job = submit_import_job(user, 'excel', file)
+            return jsonify({'success': True, 'jobId': job.id, 'status': job.status}), 202
             
+        # Read the workbook straight from the upload stream, which Werkzeug
+        # spools to a temp file for large uploads, instead of copying it into bytes
+        try:
+            max_rows = app.config['IMPORT_MAX_ROWS']
+            result = import_expenses(user, read_excel_rows(file.stream, max_rows),
+                                     batch_size=app.config['IMPORT_BATCH_SIZE'],
+                                     max_rows=max_rows)
         except Exception as e:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'error': f'Error processing Excel file: {str(e)}'
             }), 400
+        
+        return import_response(result, user)
+    
+    @app.route('/api/import/jobs/<int:job_id>', methods=['GET'])
+    def get_import_job(job_id):
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        job = ImportJob.query.filter_by(id=job_id, user_id=user.id).first()
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+            
+        fail_stale_job(job)
+        data = job_to_dict(job)
+        
+        # Finished jobs carry the same balance/progress fields as a synchronous import
+        if job.status == 'completed':
+            balance = user.balance
+            data['balance'] = balance.amount if balance else 0
+            data['budgetProgress'] = get_budget_progress(user)
+        
+        return jsonify(data)
@@ -0,0 +1,151 @@
+import logging
+import re
+from sqlalchemy import Index, and_, or_, func, inspect, literal_column, select, text
+from sqlalchemy.exc import OperationalError
+from app import db
+from models import Expense, ExpenseArchive
+from categories import all_category_names
+from utils import get_expenses_page
+
+logger = logging.getLogger(__name__)
+
+# One SQLite FTS5 index per expense table, so archived and live ids never collide
+SEARCH_TABLES = {Expense: 'expense_search', ExpenseArchive: 'expense_archive_search'}
+
+# Words of a search query; everything else (FTS syntax included) is ignored
+WORD = re.compile(r'\w+', re.UNICODE)
+
+# Tables known to have a usable search index, per database URL
+_indexed = {}
+
+def _document(model):
+    """The text a Postgres expense row is indexed by; must match the GIN index expression"""
+    return func.to_tsvector('simple', model.description)
+
+def _fts_ddl(model):
+    """
+    SQLite statements creating an external-content FTS5 index over the
+    table's descriptions, kept in step by triggers
+    """
+    source = model.__tablename__
+    index = SEARCH_TABLES[model]
+    remove = f"INSERT INTO {index}({index}, rowid, description) VALUES ('delete', old.id, old.description);"
+    add = f"INSERT INTO {index}(rowid, description) VALUES (new.id, new.description);"
+    return [
+        # prefix='2 3' keeps short prefix queries on the index instead of a term scan
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"description, content='{source}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {source} BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {source} BEGIN {remove} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF description ON {source} "
+        f"BEGIN {remove} {add} END",
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+def create_search_index():
+    """
+    Create the full-text index over expense descriptions: FTS5 tables and
+    triggers on SQLite, GIN expression indexes on Postgres. Without either,
+    search falls back to (slow) substring matching.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        for model in SEARCH_TABLES:
+            Index(f'ix_{model.__tablename__}_search', _document(model),
+                  postgresql_using='gin').create(db.engine, checkfirst=True)
+    elif dialect == 'sqlite':
+        try:
+            with db.engine.begin() as conn:
+                for model in SEARCH_TABLES:
+                    for statement in _fts_ddl(model):
+                        conn.execute(text(statement))
+        except OperationalError as e:
+            logger.warning("SQLite has no FTS5 (%s); expense search will scan descriptions", e.orig)
+    _indexed.clear()
+
+def drop_search_index():
+    """Drop the search index, e.g. before the tables it covers are rebuilt"""
+    with db.engine.begin() as conn:
+        for model, index in SEARCH_TABLES.items():
+            if db.engine.dialect.name == 'postgresql':
+                conn.execute(text(f'DROP INDEX IF EXISTS ix_{model.__tablename__}_search'))
+            elif db.engine.dialect.name == 'sqlite':
+                for trigger in ('insert', 'delete', 'update'):
+                    conn.execute(text(f'DROP TRIGGER IF EXISTS {index}_{trigger}'))
+                conn.execute(text(f'DROP TABLE IF EXISTS {index}'))
+    _indexed.clear()
+
+def _has_fts():
+    """Whether the SQLite FTS5 tables exist (checked once per process)"""
+    url = str(db.engine.url)
+    if url not in _indexed:
+        _indexed[url] = all(inspect(db.engine).has_table(name) for name in SEARCH_TABLES.values())
+    return _indexed[url]
+
+def search_terms(query):
+    """The words of a search query, lowercased; each matches as a prefix"""
+    return [word.lower() for word in WORD.findall(query or '')]
+
+def _description_matches(model, terms):
+    """Condition on `model` rows whose description has every term as a word prefix"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return _document(model).op('@@')(func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms)))
+
+    if dialect == 'sqlite' and _has_fts():
+        index = SEARCH_TABLES[model]
+        # Quoted terms can't be read as FTS5 operators
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # An uncorrelated IN runs the full-text lookup once, as a list the
+        # user's rows are checked against; joining the index to the table
+        # instead lets SQLite repeat the lookup for every row of the user
+        return model.id.in_(
+            select(literal_column('rowid')).select_from(text(index))
+            .where(literal_column(index).op('MATCH')(match))
+        )
+
+    return and_(*(model.description.icontains(term, autoescape=True) for term in terms))
+
+def _matching_categories(terms):
+    """{term: ids of the categories with a word starting with it}, from the cached category names"""
+    categories = [(category_id, search_terms(name)) for category_id, name in all_category_names().items()]
+    return {term: [category_id for category_id, words in categories if any(w.startswith(term) for w in words)]
+            for term in terms}
+
+def _matches(model, terms, categories):
+    """
+    Condition on `model` rows where every term prefixes a word of the
+    description or of the category name. Terms matching no category are
+    looked up in the description index together.
+    """
+    description_only = [term for term in terms if not categories[term]]
+    conditions = [_description_matches(model, description_only)] if description_only else []
+    conditions.extend(
+        or_(_description_matches(model, [term]), model.category_id.in_(categories[term]))
+        for term in terms if categories[term]
+    )
+    return and_(*conditions)
+
+def search_expenses(user_id, query, limit, cursor=None, start_date=None, end_date=None, category=None,
+                    min_amount=None, max_amount=None):
+    """
+    One page of the user's expenses whose description or category contains
+    every word of `query` as a prefix, newest first, with the listing filters
+    and an optional amount range. Returns the same as get_expenses_page;
+    raises ValueError for a query without words or a bad cursor.
+    """
+    terms = search_terms(query)
+    if not terms:
+        raise ValueError('Search query has no words')
+    categories = _matching_categories(terms)
+
+    def criteria(model):
+        conditions = [_matches(model, terms, categories)]
+        if min_amount is not None:
+            conditions.append(model.amount >= min_amount)
+        if max_amount is not None:
+            conditions.append(model.amount <= max_amount)
+        return and_(*conditions)
+
+    return get_expenses_page(user_id, limit, cursor, start_date, end_date, category, criteria)
@@ -0,0 +1,87 @@
+import gzip
+import json
+from flask import current_app, request
+from sqlalchemy import BigInteger, type_coerce
+from models import Expense, Income
+from money import json_default
+from categories import category_names
+
+# orjson is optional; it is several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Amounts are selected as raw integer cents and categories as ids, and both
+# are converted a column at a time
+def expense_columns(model=Expense):
+    """EXPENSE_COLUMNS of the expense table or the archive"""
+    return (model.id, model.description, type_coerce(model.amount, BigInteger).label('amount'),
+            model.category_id.label('category'), model.date)
+
+EXPENSE_COLUMNS = expense_columns()
+
+def export_columns(model=Expense):
+    """Expense columns written by the exports, amounts as Decimal (categories are still ids)"""
+    return (model.id, model.description, model.amount, model.category_id.label('category'), model.date)
+
+INCOME_COLUMNS = (Income.id, Income.description, type_coerce(Income.amount, BigInteger).label('amount'),
+                  Income.date)
+
+EXPENSE_FIELDS = ('id', 'description', 'amount', 'category', 'date')
+INCOME_FIELDS = ('id', 'description', 'amount', 'date')
+
+# Plural keys used by the columnar layout
+COLUMN_NAMES = {'id': 'ids', 'description': 'descriptions', 'amount': 'amounts',
+                'category': 'categories', 'date': 'dates'}
+
+def format_dates(dates):
+    """Format a column of datetimes as YYYY-MM-DD (isoformat is ~2.5x faster than strftime)"""
+    return [value.isoformat()[:10] for value in dates]
+
+def serialize_rows(rows, fields, layout='records'):
+    """
+    Turn selected column tuples into JSON-ready data, either a list of dicts
+    ('records', the default) or one list per field ('columnar').
+    `fields` must name the selected columns in order, end with 'date' and
+    include 'amount' selected as cents; a 'category' field holds category
+    ids, which are rendered as names (see EXPENSE_COLUMNS).
+    """
+    if not rows:
+        return {COLUMN_NAMES[field]: [] for field in fields} if layout == 'columnar' else []
+    
+    columns = [list(column) for column in zip(*rows)]
+    columns[-1] = format_dates(columns[-1])
+    amount_index = fields.index('amount')
+    columns[amount_index] = [cents / 100 for cents in columns[amount_index]]
+    if 'category' in fields:
+        category_index = fields.index('category')
+        names = category_names(columns[category_index])
+        columns[category_index] = [names[category_id] for category_id in columns[category_index]]
+    
+    if layout == 'columnar':
+        return {COLUMN_NAMES[field]: column for field, column in zip(fields, columns)}
+    return [dict(zip(fields, values)) for values in zip(*columns)]
+
+def encode_json(payload):
+    """Encode a payload as UTF-8 JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=json_default)
+    return json.dumps(payload, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def json_response(body, status=200):
+    """
+    Build a JSON response from a payload or already-encoded bytes, gzipping
+    it when the client accepts gzip and it is larger than JSON_GZIP_MIN_BYTES.
+    """
+    if not isinstance(body, bytes):
+        body = encode_json(body)
+    
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    
+    if len(body) >= current_app.config['JSON_GZIP_MIN_BYTES'] and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    
+    return response
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prelude for scripts run as a user: an app context, the user 'alice' with a
+# balance and budget as the index page would create them, and a test client
+# logged in as her
+USER_SETUP = """
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select
+from models import User, Balance, Budget
+ctx = app.app_context()
+ctx.push()
+user = User(username='alice', email='alice@example.com')
+db.session.add_all([user, Balance(amount=0, user=user), Budget(amount=0, user=user)])
+db.session.commit()
+user_id = user.id
+client = app.test_client()
+with client.session_transaction() as session:
+    session['user_id'] = user_id
+"""
+
+# The app binds its database and upgrades it on import, so every test runs
+# the code under test in a fresh interpreter pointed at its own database file
+@pytest.fixture
+def run_app(tmp_path):
+    """Run a script with the app imported against `db_path`; returns its stdout"""
+    def run(db_path, script='', **env):
+        environ = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', LOG_LEVEL='WARNING', **env)
+        code = 'from app import app, db\n' + textwrap.dedent(script)
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=environ,
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+    return run
+
+@pytest.fixture
+def run_as_user(run_app):
+    """Like run_app, with USER_SETUP run before the script"""
+    def run(db_path, script='', **env):
+        return run_app(db_path, USER_SETUP + textwrap.dedent(script), **env)
+    return run
@@ -0,0 +1,35 @@
+import json
+
+def test_archived_months_are_read_from_the_archive(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from archive import archive_expenses
+from models import Expense, ExpenseArchive
+for amount, day in [(10, '2024-01-05'), (20, '2024-01-20'), (30, '2024-02-10'), (40, '2024-03-01')]:
+    client.post('/api/expenses', json={'amount': amount, 'category': 'Food', 'date': day})
+moved = archive_expenses(datetime(2024, 2, 1), user_id)
+# The requests share this app context's session, which still holds alice from before the cutoff was set
+db.session.expire_all()
+
+listing = client.get('/api/expenses').get_json()
+page = client.get('/api/expenses?limit=10&start=2024-01-01&end=2024-01-31&includeTotal=1').get_json()
+export = client.get('/api/export/csv?start=2024-01-01&end=2024-02-29').get_data(as_text=True)
+print(json.dumps({
+    'moved': moved,
+    'archived_before': str(db.session.get(User, user_id).archived_before),
+    'archive': db.session.scalars(select(ExpenseArchive.amount).order_by(ExpenseArchive.id)).all(),
+    'hot': db.session.scalars(select(Expense.amount).order_by(Expense.id)).all(),
+    'listing': sorted(expense['amount'] for expense in listing),
+    'page': [[expense['date'], expense['amount']] for expense in page['expenses']],
+    'total': page['total'],
+    'export': [line.split(',')[2] for line in export.splitlines()[1:]],
+}, default=str))
+""")
+    result = json.loads(out)
+    assert result['moved'] == 2
+    assert result['archived_before'] == '2024-02-01 00:00:00'
+    assert result['archive'] == ['10.00', '20.00']
+    assert result['hot'] == ['30.00', '40.00']
+    assert result['listing'] == [10, 20, 30, 40]
+    assert result['page'] == [['2024-01-20', 20], ['2024-01-05', 10]]
+    assert result['total'] == 2
+    assert sorted(result['export'], key=float) == ['10.00', '20.00', '30.00']
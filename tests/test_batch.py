@@ -0,0 +1,78 @@
+import json
+
+def test_batch_results_follow_request_order(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from models import Expense
+items = [
+    {'amount': 1, 'category': 'Food', 'description': 'A', 'date': '2024-01-05'},
+    {'amount': 2, 'category': 'Food', 'description': 'Bad date', 'date': '05/01/2024'},
+    {'amount': 3, 'category': 'Fun', 'description': 'B'},
+    'not an item',
+    {'category': 'Food', 'description': 'No amount'},
+    {'amount': 4, 'category': 'Food', 'description': 'C', 'date': '2024-01-06'},
+]
+reply = client.post('/api/expenses/batch', json={'items': items}).get_json()
+stored = dict(db.session.execute(select(Expense.id, Expense.description)).all())
+print(json.dumps([reply['results'], reply['createdCount'], reply['rejectedCount'],
+                  [stored[result['id']] for result in reply['results'] if 'id' in result]]))
+""")
+    results, created, rejected, descriptions = json.loads(out)
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4, 5]
+    assert [sorted(result) for result in results] == [['id', 'index'], ['error', 'index'], ['id', 'index'],
+                                                      ['error', 'index'], ['error', 'index'], ['id', 'index']]
+    assert [created, rejected] == [3, 3]
+    assert descriptions == ['A', 'B', 'C']
+
+def test_batches_over_the_limit_are_rejected_whole(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from sqlalchemy import func
+from models import Expense, Income
+item = {'amount': 1, 'category': 'Food'}
+replies = [client.post('/api/expenses/batch', json=[item] * 4), client.post('/api/income/batch', json=[item] * 4),
+           client.post('/api/expenses/batch', json=[]), client.post('/api/expenses/batch', json={'items': 'x'}),
+           client.post('/api/expenses/batch', json=[item] * 3)]
+print(json.dumps([[reply.status_code, reply.get_json().get('error')] for reply in replies]
+                 + [db.session.scalar(select(func.count(model.id))) for model in (Expense, Income)]))
+""", BATCH_MAX_ITEMS='3')
+    assert json.loads(out) == [
+        [400, 'A batch can have at most 3 items'],
+        [400, 'A batch can have at most 3 items'],
+        [400, 'The batch is empty'],
+        [400, 'Expected a JSON array of items'],
+        [200, None],
+        3, 0,
+    ]
+
+def test_batches_update_the_balance_and_summaries_once(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from sqlalchemy import event
+from models import MonthlySummary
+from categories import category_names
+statements = []
+listener = lambda conn, cursor, statement, parameters, context, many: statements.append(statement)
+event.listen(db.engine, 'before_cursor_execute', listener)
+expenses = client.post('/api/expenses/batch', json=[
+    {'amount': '10.50', 'category': 'Food', 'date': '2024-01-05'},
+    {'amount': 4.25, 'category': 'Food', 'date': '2024-01-20'},
+    {'amount': 20, 'category': 'Fun', 'date': '2024-02-01'},
+    {'amount': 'x', 'category': 'Fun', 'date': '2024-02-01'},
+]).get_json()
+event.remove(db.engine, 'before_cursor_execute', listener)
+incomes = client.post('/api/income/batch', json=[{'amount': 100}, {'amount': '50.50'}, {'amount': 0}]).get_json()
+db.session.expire_all()
+summaries = db.session.execute(select(MonthlySummary.month, MonthlySummary.category_id, MonthlySummary.total,
+                                      MonthlySummary.count).order_by(MonthlySummary.month)).all()
+names = category_names(category_id for _, category_id, _, _ in summaries)
+print(json.dumps({
+    'balances': [expenses['balance'], incomes['balance'], float(db.session.get(User, user_id).balance.amount)],
+    'summaries': [[month, names[category_id], str(total), count] for month, category_id, total, count in summaries],
+    'balance_updates': sum(statement.startswith('UPDATE balance') for statement in statements),
+    'summary_upserts': sum(statement.startswith('INSERT INTO monthly_summary') for statement in statements),
+}))
+""")
+    assert json.loads(out) == {
+        'balances': [-34.75, 115.75, 115.75],
+        'summaries': [[1, 'Food', '14.75', 2], [2, 'Fun', '20.00', 1]],
+        'balance_updates': 1,
+        'summary_upserts': 1,
+    }
@@ -0,0 +1,40 @@
+import json
+
+def test_ttl_cache_evicts_least_recently_used_and_expired_entries(tmp_path, run_app):
+    out = run_app(tmp_path / 'test.db', """
+import json
+from types import SimpleNamespace
+import cache
+from cache import TTLCache
+
+now = [0.0]
+cache.time = SimpleNamespace(monotonic=lambda: now[0])
+entries = TTLCache(maxsize=2, ttl=30)
+entries.set('a', 1)
+entries.set('b', 2)
+entries.get('a')
+entries.set('c', 3)  # evicts b, used less recently than a
+after_eviction = [entries.get(key) for key in 'abc']
+now[0] = 31
+expired = [entries.get('a'), len(entries)]
+# c expired too, but stays until it is read
+entries.set('d', 4)
+entries.invalidate(lambda key: key == 'd')
+print(json.dumps([after_eviction, expired, len(entries), entries.stats.to_dict()]))
+""")
+    assert json.loads(out) == [
+        [1, None, 3], [None, 1], 1,
+        {'hits': 3, 'misses': 2, 'evictions': 1, 'hitRate': 0.6},
+    ]
+
+def test_cache_stats_count_each_request_once(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+# Each request in its own app context, as in production
+ctx.pop()
+for path in ('/api/expenses', '/api/expenses', '/api/user-data', '/api/user-data'):
+    client.get(path)
+print(json.dumps(client.get('/api/cache-stats').get_json()))
+""")
+    stats = json.loads(out)
+    assert stats['currentUser'] == {'hits': 0, 'misses': 4, 'evictions': 0, 'hitRate': 0}
+    assert stats['userData'] == {'hits': 1, 'misses': 1, 'evictions': 0, 'hitRate': 0.5, 'size': 1}
@@ -0,0 +1,50 @@
+import json
+
+BUDGET = {'QUERY_BUDGET': '1', 'QUERY_BUDGET_STRICT': '1'}
+
+def test_strict_budget_raises_under_test_client(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from instrumentation import QueryBudgetExceeded
+app.testing = True
+try:
+    client.post('/api/expenses', json={'amount': 5, 'category': 'Food'})
+except QueryBudgetExceeded as e:
+    print(json.dumps({'raised': 'SQL statements' in str(e)}))
+""", **BUDGET)
+    assert json.loads(out) == {'raised': True}
+
+def test_strict_budget_logs_once_response_is_sent(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+import logging
+records = []
+handler = logging.Handler()
+handler.emit = records.append
+logging.getLogger('instrumentation').addHandler(handler)
+response = client.post('/api/expenses', json={'amount': 5, 'category': 'Food'})
+listed = client.get('/api/expenses').get_json()
+print(json.dumps({'status': response.status_code, 'expenses': len(listed),
+                  'levels': sorted({record.levelname for record in records})}))
+""", **BUDGET)
+    assert json.loads(out) == {'status': 200, 'expenses': 1, 'levels': ['ERROR']}
+
+def test_exports_are_exempt(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+app.testing = True
+print(json.dumps([client.get(f'/api/export/{kind}').status_code for kind in ('csv', 'excel')]))
+""", **BUDGET)
+    assert json.loads(out) == [200, 200]
+
+def test_failed_statements_leave_no_timing_behind(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+conn = db.session.connection()
+for _ in range(3):
+    try:
+        conn.execute(text('SELECT * FROM missing_table'))
+    except OperationalError:
+        pass
+conn.execute(text('SELECT 1'))
+print(json.dumps(conn.info['query_started']))
+""", **BUDGET)
+    assert json.loads(out) == []
@@ -0,0 +1,32 @@
+import json
+
+# A running job of the user's, started an hour ago and last heard from
+# `minutes_ago` (None: never, as on SQLite)
+RUNNING_JOB = """
+from models import ImportJob
+
+def running_job(minutes_ago):
+    heartbeat = datetime.utcnow() - timedelta(minutes=minutes_ago) if minutes_ago is not None else None
+    job = ImportJob(user_id=user_id, kind='csv', filename='x.csv', status='running',
+                    started_at=datetime.utcnow() - timedelta(hours=1), heartbeat_at=heartbeat)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+"""
+
+def test_polling_fails_a_job_that_stopped_reporting(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', RUNNING_JOB + """
+jobs = running_job(60), running_job(1), running_job(None)
+print(json.dumps([client.get(f'/api/import/jobs/{job_id}').get_json()['status'] for job_id in jobs]))
+""")
+    assert json.loads(out) == ['failed', 'running', 'running']
+
+def test_saved_progress_counts_as_a_heartbeat(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', RUNNING_JOB + """
+from jobs import _save_progress
+job_id = running_job(60)
+_save_progress(job_id, 20000, 19990, 10)
+data = client.get(f'/api/import/jobs/{job_id}').get_json()
+print(json.dumps([data['status'], data['processedRows'], data['importedCount'], data['rejectedCount']]))
+""")
+    assert json.loads(out) == ['running', 20000, 19990, 10]
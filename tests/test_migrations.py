@@ -0,0 +1,86 @@
+import sqlite3
+
+# Schema of databases created before any migration existed
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(64) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(256), PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE expense (
+    id INTEGER NOT NULL, description VARCHAR(120) NOT NULL, amount FLOAT NOT NULL,
+    category VARCHAR(50) NOT NULL, date DATETIME, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE income (
+    id INTEGER NOT NULL, description VARCHAR(120) NOT NULL, amount FLOAT NOT NULL,
+    date DATETIME, user_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE balance (
+    id INTEGER NOT NULL, amount FLOAT, last_updated DATETIME, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE budget (
+    id INTEGER NOT NULL, amount FLOAT, month INTEGER, year INTEGER, last_updated DATETIME,
+    user_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+"""
+
+def create_baseline_db(path, expenses):
+    """A baseline-schema database with one user and the given (description, amount, category, date) expenses"""
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO user (id, username, email) VALUES (1, 'alice', 'alice@example.com')")
+    conn.executemany("INSERT INTO expense (description, amount, category, date, user_id) VALUES (?, ?, ?, ?, 1)",
+                     expenses)
+    conn.commit()
+    conn.close()
+
+def test_upgrade_interns_repeated_category_names(tmp_path, run_app):
+    path = tmp_path / 'baseline.db'
+    create_baseline_db(path, [
+        ('Lunch', 12.5, 'Food', '2024-01-03 00:00:00'),
+        ('Dinner', 30.0, 'Food', '2024-01-04 00:00:00'),
+        ('Rent', 900.0, 'Housing', '2024-01-01 00:00:00'),
+        ('Snack', 2.25, 'Food', '2024-02-01 00:00:00'),
+    ])
+
+    run_app(path)
+
+    conn = sqlite3.connect(path)
+    assert sorted(name for name, in conn.execute('SELECT name FROM category')) == ['Food', 'Housing']
+    rows = conn.execute('SELECT expense.description, category.name, expense.amount FROM expense '
+                        'JOIN category ON category.id = expense.category_id ORDER BY expense.id').fetchall()
+    assert rows == [('Lunch', 'Food', 1250), ('Dinner', 'Food', 3000),
+                    ('Rent', 'Housing', 90000), ('Snack', 'Food', 225)]
+    totals = conn.execute('SELECT category.name, monthly_summary.total FROM monthly_summary '
+                          'JOIN category ON category.id = monthly_summary.category_id '
+                          'ORDER BY monthly_summary.month, category.name').fetchall()
+    assert totals == [('Food', 4250), ('Housing', 90000), ('Food', 225)]
+
+# Archive everything, then add an expense and print the new id
+ARCHIVE_AND_ADD = """
+from datetime import datetime
+from decimal import Decimal
+from archive import archive_expenses, closed_month_cutoff
+from categories import category_id
+from models import Expense
+with app.app_context():
+    archive_expenses(closed_month_cutoff(0))
+    expense = Expense(user_id=1, description='Coffee', amount=Decimal('3.50'),
+                      category_id=category_id('Food'), date=datetime.utcnow())
+    db.session.add(expense)
+    db.session.commit()
+    print(expense.id)
+"""
+
+def test_archiving_an_upgraded_database_does_not_reuse_ids(tmp_path, run_app):
+    path = tmp_path / 'baseline.db'
+    create_baseline_db(path, [
+        ('Lunch', 12.5, 'Food', '2024-01-03 00:00:00'),
+        ('Rent', 900.0, 'Housing', '2024-01-01 00:00:00'),
+    ])
+
+    assert run_app(path, ARCHIVE_AND_ADD).strip() == '3'
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT id FROM expense_archive ORDER BY id').fetchall() == [(1,), (2,)]
@@ -0,0 +1,49 @@
+import json
+
+def test_amounts_round_half_up_to_whole_cents(tmp_path, run_app):
+    out = run_app(tmp_path / 'test.db', """
+import json
+from decimal import Decimal
+from money import parse_amount, to_cents, from_cents
+print(json.dumps({
+    'parsed': [str(parse_amount(value)) for value in ('12.345', ' 5 ', 0.1, Decimal('2.675'), -1.005, 7)],
+    'cents': [to_cents(value) for value in ('19.999', 0.1 + 0.2, Decimal('0.005'), -3)],
+    'amounts': [str(from_cents(value)) for value in (1999, 1250.0, -5, 0)],
+}))
+""")
+    assert json.loads(out) == {
+        'parsed': ['12.35', '5.00', '0.10', '2.68', '-1.01', '7.00'],
+        'cents': [2000, 30, 1, -300],
+        'amounts': ['19.99', '12.50', '-0.05', '0.00'],
+    }
+
+def test_invalid_amounts_are_rejected(tmp_path, run_app):
+    out = run_app(tmp_path / 'test.db', """
+import json
+from money import parse_amount, to_cents
+
+def rejected(convert, value):
+    try:
+        convert(value)
+    except ValueError:
+        return True
+    return False
+
+values = [None, True, '', 'abc', '1,50', 'NaN', 'Infinity', float('inf'), []]
+print(json.dumps([[rejected(convert, value) for value in values] for convert in (parse_amount, to_cents)]))
+""")
+    assert json.loads(out) == [[True] * 9] * 2
+
+def test_json_encodes_amounts_as_numbers(tmp_path, run_app):
+    out = run_app(tmp_path / 'test.db', """
+from datetime import date
+from decimal import Decimal
+print(app.json.dumps({'amount': Decimal('19.90'), 'date': date(2024, 1, 5)}))
+try:
+    app.json.dumps({'other': object()})
+except TypeError:
+    print('TypeError')
+""")
+    payload, error = out.splitlines()
+    assert json.loads(payload) == {'amount': 19.9, 'date': 'Fri, 05 Jan 2024 00:00:00 GMT'}
+    assert error == 'TypeError'
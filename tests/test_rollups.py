@@ -0,0 +1,86 @@
+import json
+
+ROLLUPS = """
+from categories import category_id
+from models import MonthlySummary, RecurringSeries
+from recurring import _insert_series, normalize_description, series_added
+from rollups import apply_summary_deltas
+food = category_id('Food')
+"""
+
+def test_summary_deltas_add_to_and_drop_buckets(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', ROLLUPS + """
+apply_summary_deltas(user.id, {(2024, 1, food): [Decimal('10.00'), 1]})
+apply_summary_deltas(user.id, {(2024, 1, food): [Decimal('5.50'), 1], (2024, 2, food): [Decimal('3.00'), 1]})
+apply_summary_deltas(user.id, {(2024, 2, food): [Decimal('-3.00'), -1], (2024, 3, food): [Decimal('-1.00'), -1]})
+db.session.commit()
+rows = db.session.execute(select(MonthlySummary.month, MonthlySummary.total, MonthlySummary.count)).all()
+print(json.dumps([[month, str(total), count] for month, total, count in rows]))
+""")
+    assert json.loads(out) == [[1, '15.50', 2]]
+
+def test_new_series_merge_into_one_added_concurrently(tmp_path, run_as_user):
+    # The row another transaction inserted after series_added looked the key up
+    out = run_as_user(tmp_path / 'test.db', ROLLUPS + """
+series_added(user.id, [('Netflix', food, datetime(2024, 2, 1), Decimal('9.99'))])
+_insert_series([{'user_id': user.id, 'key': normalize_description('NETFLIX '), 'description': 'NETFLIX ',
+                 'category_id': food, 'count': 2, 'total': Decimal('19.00'), 'min_amount': Decimal('8.50'),
+                 'max_amount': Decimal('10.50'), 'first_date': datetime(2024, 1, 1),
+                 'last_date': datetime(2024, 3, 1)}])
+db.session.commit()
+series = db.session.scalars(select(RecurringSeries)).one()
+print(json.dumps([series.description, series.count, str(series.total), str(series.min_amount),
+                  str(series.max_amount), str(series.first_date.date()), str(series.last_date.date())]))
+""")
+    assert json.loads(out) == ['NETFLIX ', 3, '28.99', '8.50', '10.50', '2024-01-01', '2024-03-01']
+
+def test_removals_recompute_only_their_series(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', ROLLUPS + """
+from recurring import rebuild_recurring_series
+items = [{'amount': 10 + i, 'category': 'Food', 'description': description, 'date': f'2024-0{i + 1}-05'}
+         for i, description in enumerate(['Café Noir', 'CAFÉ  noir', 'Gym 50%', 'gym 50%', 'Gym_50%'])]
+ids = [item['id'] for item in client.post('/api/expenses/batch', json=items).get_json()['results']]
+
+def series():
+    rows = db.session.execute(select(RecurringSeries.key, RecurringSeries.count, RecurringSeries.total,
+                                     RecurringSeries.last_date)
+                              .order_by(RecurringSeries.key)).all()
+    return [[key, count, str(total), str(last_date.date())] for key, count, total, last_date in rows]
+
+client.delete(f'/api/expenses/{ids[1]}', json={})
+client.post('/api/expenses/bulk-delete', json={'ids': [ids[3]]})
+db.session.expire_all()
+after_removals = series()
+rebuild_recurring_series(user.id)
+db.session.commit()
+print(json.dumps([after_removals, series()]))
+""")
+    after_removals, rebuilt = json.loads(out)
+    assert after_removals == rebuilt == [
+        ['café noir', 1, '10.00', '2024-01-05'],
+        ['gym 50%', 1, '12.00', '2024-03-05'],
+        ['gym_50%', 1, '14.00', '2024-05-05'],
+    ]
+
+def test_removals_look_their_series_up_by_key(tmp_path, run_as_user):
+    # Matching descriptions with LIKE patterns scanned the user's whole
+    # history; each table's series key index must be searched instead
+    out = run_as_user(tmp_path / 'test.db', ROLLUPS + """
+from sqlalchemy import event
+items = [{'amount': 5, 'category': 'Food', 'description': f'Shop {i % 3}', 'date': '2024-01-05'} for i in range(6)]
+ids = [item['id'] for item in client.post('/api/expenses/batch', json=items).get_json()['results']]
+statements = []
+listener = lambda conn, cursor, statement, parameters, context, many: statements.append((statement, parameters))
+event.listen(db.engine, 'before_cursor_execute', listener)
+client.post('/api/expenses/bulk-delete', json={'ids': ids[:2]})
+event.remove(db.engine, 'before_cursor_execute', listener)
+plans = [db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+         for statement, parameters in statements if 'series_key IN' in statement]
+print(json.dumps([[row[3] for row in plan if 'expense' in row[3]] for plan in plans]))
+""")
+    plans = json.loads(out)
+    assert len(plans) == 1
+    assert [detail.split(' (')[0] for detail in plans[0]] == [
+        'SEARCH expense USING INDEX ix_expense_user_series_key',
+        'SEARCH expense_archive USING INDEX ix_expense_archive_user_series_key',
+    ]
@@ -0,0 +1,72 @@
+import json
+
+# A second user, bob, and helpers to add and search expenses
+SEARCH = """
+import sqlite3
+from categories import category_id
+from models import Expense
+from search import search_expenses
+alice, bob = user, User(username='bob', email='bob@example.com')
+db.session.add(bob)
+db.session.commit()
+
+def add(user, description, category, day):
+    db.session.add(Expense(user_id=user.id, description=description, amount=Decimal('5.00'),
+                           category_id=category_id(category), date=datetime(2024, 1, day)))
+    db.session.commit()
+
+def found(user, query):
+    expenses, _ = search_expenses(user.id, query, 50)
+    return sorted(expense.description for expense in expenses)
+"""
+
+def test_search_only_matches_the_users_expenses(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', SEARCH + """
+for day in range(1, 21):
+    add(bob, f'Coffee beans {day}', 'Food', day)
+add(alice, 'Coffee to go', 'Food', 2)
+add(alice, 'Cinema', 'Fun', 3)
+print(json.dumps([found(alice, 'coff'), found(alice, 'food coffee'), len(found(bob, 'beans'))]))
+""")
+    assert json.loads(out) == [['Coffee to go'], ['Coffee to go'], 20]
+
+def test_search_sees_categories_added_by_other_processes(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', SEARCH + """
+add(alice, 'Ticket', 'Fun', 1)
+before = found(alice, 'travel')
+conn = sqlite3.connect(db.engine.url.database)
+conn.execute("INSERT INTO category (name) VALUES ('Travel')")
+conn.execute("INSERT INTO expense (description, series_key, amount, category_id, date, user_id) "
+             "SELECT 'Train', 'train', 500, id, '2024-01-02 00:00:00', ? FROM category WHERE name = 'Travel'",
+             (alice.id,))
+conn.commit()
+print(json.dumps([before, found(alice, 'travel')]))
+""")
+    assert json.loads(out) == [[], ['Train']]
+
+def test_full_text_lookup_runs_once_per_search(tmp_path, run_as_user):
+    # The FTS5 MATCH must be an uncorrelated list, not the inner side of a
+    # loop over the user's rows, which took minutes on a large history
+    out = run_as_user(tmp_path / 'test.db', SEARCH + """
+from sqlalchemy import event
+add(alice, 'Coffee to go', 'Food', 2)
+statements = []
+listener = lambda conn, cursor, statement, parameters, context, many: statements.append((statement, parameters))
+event.listen(db.engine, 'before_cursor_execute', listener)
+found(alice, 'coffee to')
+found(alice, 'food coffee')
+event.remove(db.engine, 'before_cursor_execute', listener)
+plans = [db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+         for statement, parameters in statements if 'MATCH' in statement]
+print(json.dumps([[[row[0], row[1], row[3]] for row in plan] for plan in plans]))
+""")
+    plans = json.loads(out)
+    assert len(plans) == 2
+    for plan in plans:
+        details = {node: detail for node, _, detail in plan}
+        lookups = [(parent, detail) for _, parent, detail in plan if 'expense_search' in detail]
+        assert lookups
+        for parent, detail in lookups:
+            # Nothing else is looked up inside the subquery, so the lookup can't be repeated per row
+            assert details[parent].startswith('LIST SUBQUERY'), plan
+            assert [detail for _, other, detail in plan if other == parent] == [detail], plan
@@ -0,0 +1,53 @@
+import json
+
+def test_cursor_pages_split_expenses_on_the_same_date(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+for amount, day in [(1, '2024-01-04'), (2, '2024-01-05'), (3, '2024-01-05'), (4, '2024-01-05'),
+                    (5, '2024-01-05'), (6, '2024-01-05'), (7, '2024-01-06')]:
+    client.post('/api/expenses', json={'amount': amount, 'category': 'Food', 'date': day})
+
+pages, cursor = [], None
+while True:
+    page = client.get('/api/expenses', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})}).get_json()
+    pages.append([expense['amount'] for expense in page['expenses']])
+    cursor = page['nextCursor']
+    if cursor is None:
+        break
+print(json.dumps(pages))
+""")
+    # Newest first, and by id (the insertion order here) within a date
+    assert json.loads(out) == [[7, 6], [5, 4], [3, 2], [1]]
+
+def test_malformed_cursors_are_rejected(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+import base64
+cursors = ['not-a-cursor'] + [base64.urlsafe_b64encode(raw).decode() for raw in (b'2024-01-05|x', b'\\xff')]
+print(json.dumps([client.get('/api/expenses', query_string={'limit': 2, 'cursor': cursor}).status_code
+                  for cursor in cursors]))
+""")
+    assert json.loads(out) == [400, 400, 400]
+
+def test_conditional_gets_revalidate_against_the_data_version(tmp_path, run_as_user):
+    out = run_as_user(tmp_path / 'test.db', """
+# Each request in its own app context, as in production, so nothing is remembered between them
+ctx.pop()
+client.post('/api/expenses', json={'amount': 5, 'category': 'Food', 'date': '2024-01-05'})
+first = client.get('/api/expenses')
+etag = first.headers['ETag']
+unchanged = client.get('/api/expenses', headers={'If-None-Match': etag})
+other_path = client.get('/api/expenses?category=Food', headers={'If-None-Match': etag})
+client.post('/api/expenses', json={'amount': 7, 'category': 'Food', 'date': '2024-01-06'})
+changed = client.get('/api/expenses', headers={'If-None-Match': etag})
+print(json.dumps({
+    'first': [first.status_code, first.headers['Cache-Control'], etag.startswith('W/')],
+    'unchanged': [unchanged.status_code, unchanged.headers['ETag'] == etag, unchanged.get_data(as_text=True)],
+    'other_path': [other_path.status_code, other_path.headers['ETag'] != etag],
+    'changed': [changed.status_code, changed.headers['ETag'] != etag, len(changed.get_json())],
+}))
+""")
+    assert json.loads(out) == {
+        'first': [200, 'private, no-cache', True],
+        'unchanged': [304, True, ''],
+        'other_path': [200, True],
+        'changed': [200, True, 2],
+    }
@@ -1,153 +1,326 @@
-from flask import session
-from datetime import datetime
-from models import User, Expense
+import base64
+import hashlib
+import zlib
+from functools import wraps
+from flask import session, g, request, current_app, make_response
+from datetime import datetime, timedelta, date
+from sqlalchemy import func, select, update, and_, or_, union_all
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from models import User, Expense, Balance, MonthlySummary
+from cache import current_user_stats
+from serializers import expense_columns
+from categories import category_id, category_names
+from archive import expense_models
 
-def get_current_user():
-    """Get current user from session"""
+# Loader options for the user every request works on: balance and budget come
+# in the same SELECT. The expense and income collections are never loaded whole.
+USER_CONTEXT_OPTIONS = (joinedload(User.balance), joinedload(User.budget))
+
+def _load_current_user():
+    """The session's user, loaded once per request along with balance and budget"""
     user_id = session.get('user_id')
     if not user_id:
         return None
-    return User.query.get(user_id)
+    
+    if 'current_user' not in g:
+        g.current_user = db.session.scalars(
+            select(User)
+            .options(*USER_CONTEXT_OPTIONS)
+            .where(User.id == user_id)
+        ).first()
+    return g.current_user
 
-def get_monthly_expenses(user_id, month, year, category=None):
-    """Get expenses for a specific month and year"""
-    # Start and end date for the month
+def get_current_user():
+    """
+    Get current user from session, loaded once per request along with balance
+    and budget. The view's first call counts as a cache miss and any repeat
+    call as a hit; conditional_on_user_data's lookup ahead of it isn't counted.
+    """
+    if not session.get('user_id'):
+        return None
+    current_user_stats.record('hits' if 'current_user_counted' in g else 'misses')
+    g.current_user_counted = True
+    return _load_current_user()
+
+def mark_data_changed(user_id):
+    """
+    Bump the user's data version in the current transaction. Every write path
+    calls this before committing; cached payloads are dropped on commit.
+    """
+    db.session.execute(
+        update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+    )
+    db.session.info.setdefault('changed_user_ids', set()).add(user_id)
+
+def adjust_balance(user, delta):
+    """
+    Add `delta` to the user's balance with one atomic UPDATE in the current
+    transaction, so concurrent requests can't overwrite each other's change.
+    Returns the new amount, or None if the user has no balance row.
+    """
+    new_amount = db.session.execute(
+        update(Balance)
+        .where(Balance.user_id == user.id)
+        .values(amount=Balance.amount + delta, last_updated=datetime.utcnow())
+        .returning(Balance.amount),
+        execution_options={'synchronize_session': False}
+    ).scalar()
+    
+    # Keep the loaded object in step without flushing its stale amount back
+    if new_amount is not None and user.balance is not None:
+        set_committed_value(user.balance, 'amount', new_amount)
+    return new_amount
+
+def conditional_on_user_data(view):
+    """
+    Answer GET requests with a weak ETag derived from the user's data version,
+    the date and the full request path, and with 304 when the client has it.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = _load_current_user()
+        if request.method != 'GET' or not user:
+            return view(*args, **kwargs)
+        
+        key = f"{user.id}:{user.data_version}:{date.today().isoformat()}:{request.full_path}"
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        # Let browsers keep the body but revalidate on every fetch
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    return wrapper
+
+def get_month_range(month, year):
+    """Get the [start, end) datetimes covering a month"""
     start_date = datetime(year, month, 1)
     
-    # Determine the last day of the month
+    # Determine the first day of the following month
     if month == 12:
         end_date = datetime(year + 1, 1, 1)
     else:
         end_date = datetime(year, month + 1, 1)
     
-    # Query expenses
+    return start_date, end_date
+
+def get_monthly_expenses(user_id, month, year, category=None):
+    """Get expenses for a specific month and year, from the archive for archived months"""
+    start_date, end_date = get_month_range(month, year)
+    
+    expenses = []
+    for model in expense_models(user_id, start_date):
+        expenses.extend(db.session.scalars(
+            filter_expenses(select(model), user_id, start_date, end_date, category, model)
+        ))
+    
+    expenses.sort(key=lambda expense: expense.date, reverse=True)
+    return expenses
+
+def parse_date_range(args):
+    """
+    Parse optional `start`/`end` (YYYY-MM-DD, inclusive) query arguments into
+    a [start, end) datetime pair. Raises ValueError on a malformed date.
+    """
+    start_str = args.get('start')
+    end_str = args.get('end')
+    
+    start_date = datetime.strptime(start_str, '%Y-%m-%d') if start_str else None
+    end_date = datetime.strptime(end_str, '%Y-%m-%d') + timedelta(days=1) if end_str else None
+    
+    return start_date, end_date
+
+def filter_expenses(query, user_id, start_date=None, end_date=None, category=None, model=Expense):
+    """Apply the user, date range and category filters shared by listings and exports"""
+    query = query.where(model.user_id == user_id)
+    if start_date:
+        query = query.where(model.date >= start_date)
+    if end_date:
+        query = query.where(model.date < end_date)
     if category:
-        expenses = Expense.query.filter(
-            Expense.user_id == user_id,
-            Expense.date >= start_date,
-            Expense.date < end_date,
-            Expense.category == category
-        ).order_by(Expense.date.desc()).all()
+        # An unknown name matches nothing (category_id IS NULL)
+        query = query.where(model.category_id == category_id(category, create=False))
+    return query
+
+def select_expenses(user_id, columns=expense_columns, start_date=None, end_date=None, category=None,
+                    criteria=None, limit=None):
+    """
+    SELECT `columns(model)` of the user's matching expenses, newest first, from
+    the expense table and, when the range reaches archived months, the archive.
+    The columns must include `date` and `id`; `criteria(model)` adds a condition.
+    """
+    def branch(model):
+        query = filter_expenses(select(*columns(model)), user_id, start_date, end_date, category, model)
+        if criteria is not None:
+            query = query.where(criteria(model))
+        return query
+    
+    models = expense_models(user_id, start_date)
+    if len(models) == 1:
+        query = branch(Expense).order_by(Expense.date.desc(), Expense.id.desc())
+        return query.limit(limit) if limit else query
+    
+    branches = []
+    for model in models:
+        query = branch(model)
+        if limit:
+            # Each table contributes at most one page, read in index order
+            query = select(query.order_by(model.date.desc(), model.id.desc()).limit(limit).subquery())
+        branches.append(query)
+    
+    merged = union_all(*branches).subquery()
+    query = select(*merged.c).order_by(merged.c.date.desc(), merged.c.id.desc())
+    return query.limit(limit) if limit else query
+
+def encode_cursor(date, expense_id):
+    """Encode the (date, id) of the last row of a page as an opaque cursor"""
+    raw = f"{date.isoformat()}|{expense_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_str, expense_id = raw.split('|')
+        return datetime.fromisoformat(date_str), int(expense_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def get_expenses_page(user_id, limit, cursor=None, start_date=None, end_date=None, category=None,
+                      criteria=None):
+    """
+    Get one page of expenses, newest first, using keyset pagination on
+    (date, id). `criteria(model)` adds a condition, as in select_expenses.
+    Returns expense_columns rows and the cursor for the next page (None on
+    the last page).
+    """
+    page_criteria = criteria
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        
+        def after_cursor_criteria(model):
+            after_cursor = or_(model.date < cursor_date, and_(model.date == cursor_date, model.id < cursor_id))
+            return and_(criteria(model), after_cursor) if criteria else after_cursor
+        page_criteria = after_cursor_criteria
+    
+    # Fetch one extra row to learn whether another page follows
+    expenses = db.session.execute(
+        select_expenses(user_id, expense_columns, start_date, end_date, category, page_criteria, limit + 1)
+    ).all()
+    
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_cursor(expenses[-1].date, expenses[-1].id)
+    
+    return expenses, next_cursor
+
+def count_expenses(user_id, start_date=None, end_date=None, category=None):
+    """Count matching expenses, from the monthly summaries when no date range is given"""
+    if start_date is None and end_date is None:
+        query = select(func.sum(MonthlySummary.count)).where(MonthlySummary.user_id == user_id)
+        if category:
+            query = query.where(MonthlySummary.category_id == category_id(category, create=False))
     else:
-        expenses = Expense.query.filter(
-            Expense.user_id == user_id,
-            Expense.date >= start_date,
-            Expense.date < end_date
-        ).order_by(Expense.date.desc()).all()
+        return sum(
+            db.session.scalar(filter_expenses(select(func.count(model.id)), user_id, start_date, end_date,
+                                              category, model))
+            for model in expense_models(user_id, start_date)
+        )
     
-    return expenses
+    return db.session.scalar(query) or 0
 
-def calculate_budget_progress(budget, expenses):
+def gzip_stream(chunks):
+    """Gzip-compress an iterable of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def get_monthly_total(user_id, month, year):
+    """Sum a month's expenses from the monthly summaries"""
+    total = db.session.query(func.sum(MonthlySummary.total)).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.year == year,
+        MonthlySummary.month == month
+    ).scalar()
+    
+    return total or 0
+
+def calculate_budget_progress(budget, total_expenses):
     """Calculate budget utilization as a percentage"""
     if not budget or budget <= 0:
         return 0
     
-    total_expenses = sum(expense.amount for expense in expenses)
     progress = (total_expenses / budget) * 100
     
     # Cap at 100% for display purposes
     return min(progress, 100)
 
-def get_category_totals(expenses):
-    """Calculate total amount spent per category"""
-    category_totals = {}
+def get_budget_progress(user, month=None, year=None):
+    """Calculate a user's budget progress for a month (defaults to the current one)"""
+    today = datetime.now()
+    month = month or today.month
+    year = year or today.year
     
-    for expense in expenses:
-        category = expense.category
-        amount = expense.amount
-        
-        if category in category_totals:
-            category_totals[category] += amount
-        else:
-            category_totals[category] = amount
+    budget = user.budget
+    budget_amount = budget.amount if budget else 0
+    if not budget_amount or budget_amount <= 0:
+        return 0
     
-    return category_totals
+    return calculate_budget_progress(budget_amount, get_monthly_total(user.id, month, year))
+
+def get_category_totals(user_id, month, year):
+    """Get total amount spent per category from the monthly summaries"""
+    rows = db.session.query(MonthlySummary.category_id, MonthlySummary.total).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.year == year,
+        MonthlySummary.month == month
+    ).all()
+    
+    names = category_names(category_id for category_id, _ in rows)
+    return {names[category_id]: total for category_id, total in rows}
 
 def get_monthly_trend_data(user_id, number_of_months=6):
-    """Get expense data for the past several months for trend analysis"""
+    """Get expense totals for the past several months with a single grouped query"""
     today = datetime.today()
-    current_month = today.month
-    current_year = today.year
     
-    monthly_data = []
+    # Months are counted from year 0 so the window start is a simple subtraction
+    first_index = today.year * 12 + (today.month - 1) - (number_of_months - 1)
     
-    for i in range(number_of_months):
-        # Calculate month and year to fetch
-        month = current_month - i
-        year = current_year
-        
-        # Adjust for previous years
-        while month <= 0:
-            month += 12
-            year -= 1
-        
-        # Get expenses for this month
-        expenses = get_monthly_expenses(user_id, month, year)
-        total = sum(expense.amount for expense in expenses)
-        
-        # Add data point
+    # Read the window from the monthly summaries, one row per month
+    month_index = MonthlySummary.year * 12 + MonthlySummary.month - 1
+    rows = db.session.query(
+        MonthlySummary.year, MonthlySummary.month, func.sum(MonthlySummary.total)
+    ).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.year >= first_index // 12,
+        month_index >= first_index,
+        month_index < first_index + number_of_months
+    ).group_by(MonthlySummary.year, MonthlySummary.month).all()
+    
+    totals = {(year, month): total for year, month, total in rows}
+    
+    # Emit every month in chronological order, including months with no expenses
+    monthly_data = []
+    for index in range(first_index, first_index + number_of_months):
+        year, month = index // 12, index % 12 + 1
         monthly_data.append({
             'month': month,
             'year': year,
-            'total': total,
+            'total': totals.get((year, month), 0),
             'label': f"{month}/{year}"
         })
     
-    # Reverse to get chronological order
-    monthly_data.reverse()
-    
     return monthly_data
-
-def detect_recurring_expenses(user_id, threshold=0.9):
-    """
-    Detect potential recurring expenses by finding similar descriptions 
-    and amounts across multiple months
-    """
-    # Get all expenses
-    expenses = Expense.query.filter_by(user_id=user_id).order_by(Expense.description).all()
-    
-    # Group expenses by description (case insensitive)
-    grouped_expenses = {}
-    for expense in expenses:
-        key = expense.description.lower()
-        if key in grouped_expenses:
-            grouped_expenses[key].append(expense)
-        else:
-            grouped_expenses[key] = [expense]
-    
-    # Find potential recurring expenses
-    recurring = []
-    
-    for description, expenses_list in grouped_expenses.items():
-        # Need at least 2 expenses to consider recurring
-        if len(expenses_list) < 2:
-            continue
-        
-        # Check if amounts are similar and appear in different months
-        amounts = [e.amount for e in expenses_list]
-        dates = [e.date for e in expenses_list]
-        
-        # Check if these expenses occur in different months
-        months = set((d.year, d.month) for d in dates)
-        
-        if len(months) >= 2:
-            # Calculate average and check if all amounts are within threshold
-            avg_amount = sum(amounts) / len(amounts)
-            is_recurring = all(abs(amount - avg_amount) / avg_amount <= threshold for amount in amounts)
-            
-            if is_recurring:
-                # Determine frequency (monthly, etc.)
-                frequency = "Monthly"  # Default assumption
-                
-                # Use the most recent expense for display
-                newest_expense = max(expenses_list, key=lambda e: e.date)
-                
-                recurring.append({
-                    'description': newest_expense.description,
-                    'category': newest_expense.category,
-                    'amount': avg_amount,
-                    'frequency': frequency,
-                    'count': len(expenses_list)
-                })
-    
-    return recurring